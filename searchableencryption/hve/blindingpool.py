@@ -0,0 +1,72 @@
+""" Pool of pre-computed blinding factors for HVE encryption.
+
+Every `hve.encrypt` call needs 2 * width + 1 blinding factors `g_q ** random`
+which do not depend on the plaintext.
+The application fills the pool with `refill` while it is idle (offline phase),
+so that encryptions (online phase) only pick them up.
+
+The pool is not filled by a background thread: Charm holds the GIL while computing group operations,
+so such a thread would compete with the encrypting thread during a burst of encryptions
+instead of computing ahead of it.
+"""
+from collections import deque
+
+from searchableencryption.hve.util import fixed_base
+from searchableencryption.toolbox.randomness import random_exponents
+
+
+class BlindingPool(object):
+    """ Pool of blinding factors `g_q ** random` for a public key.
+
+    `refill` fills the pool up to `size` elements.
+    When the pool runs dry, the missing blinding factors are computed inline.
+    """
+
+    def __init__(self, pk, size: int = 4096):
+        """
+        :param pk: public key or prepared public key
+        :param int size: maximum number of blinding factors in the pool
+        """
+        assert size > 0, "Error: size must be positive"
+
+        self.g_q = fixed_base(pk['g_q'])
+        self.n = pk['group'].order()
+        self.size = size
+        self._pool = deque()
+
+    def __len__(self):
+        return len(self._pool)
+
+    def new_blinding_factors(self, count: int) -> list:
+        """ Compute new blinding factors `g_q ** random`
+
+        :param int count: number of blinding factors
+        :returns: list of blinding factors
+        """
+        return [self.g_q ** z for z in random_exponents(self.n, count)]
+
+    def refill(self, count: int = None) -> int:
+        """ Add blinding factors to the pool, e.g. while the application is idle
+
+        :param int count: maximum number of blinding factors to add, default is up to `size`
+        :returns: number of added blinding factors
+        """
+        missing = self.size - len(self._pool)
+        if count is not None:
+            missing = min(missing, count)
+        if missing <= 0:
+            return 0
+        self._pool.extend(self.new_blinding_factors(missing))
+        return missing
+
+    def take(self, count: int) -> list:
+        """ Take `count` blinding factors from the pool.
+        Blinding factors are computed inline if the pool does not have enough of them.
+
+        :param int count: number of blinding factors
+        :returns: list of blinding factors
+        """
+        values = [self._pool.popleft() for _ in range(min(count, len(self._pool)))]
+        if len(values) < count:
+            values.extend(self.new_blinding_factors(count - len(values)))
+        return values
@@ -3,31 +3,41 @@ Section 3.3 of 'An Efficient Privacy-Preserving System for Monitoring Mobile Use
 Making Searchable Encryption Practical'
 
 Link: https://dl.acm.org/citation.cfm?id=2557559
+
+The i-th vector of the reflected gray encoding is the binary representation of `i ^ (i >> 1)`,
+most significant bit first, so a cell is encoded without building the recursive table.
 """
+from functools import lru_cache
 
+import numpy as np
 
-def get_encoding_vector(dim: int) -> list:
-    """ Get grey encoding binary representation of vector dimension dim.
-    See Section 3.3 in `https://dl.acm.org/citation.cfm?id=2557559`
 
-    :param int dim: dimension of the vector
+def gray_code(i: int) -> int:
+    """ Get the reflected gray code of i
 
-    :returns: a list of binary representation
+    :param int i: a non-negative integer
+
+    :returns: the gray code of i
     """
-    if dim == 1:
-        return [[0], [1]]
+    return i ^ (i >> 1)
+
 
-    g_prev = get_encoding_vector(dim - 1)
+@lru_cache(maxsize=None)
+def _encoding_table(dim: int) -> tuple:
+    """ Gray encoding binary representations of vector dimension dim as tuples, cached per dimension
+    """
+    return tuple(tuple((gray_code(i) >> (dim - 1 - bit)) & 1 for bit in range(dim)) for i in range(2 ** dim))
 
-    rep = []
 
-    for val in g_prev:
-        rep.append([0] + val)
+def get_encoding_vector(dim: int) -> list:
+    """ Get grey encoding binary representation of vector dimension dim.
+    See Section 3.3 in `https://dl.acm.org/citation.cfm?id=2557559`
 
-    for val in reversed(g_prev):
-        rep.append([1] + val)
+    :param int dim: dimension of the vector
 
-    return rep
+    :returns: a list of binary representation
+    """
+    return [list(val) for val in _encoding_table(dim)]
 
 
 def encode_cell_id(dim: int, row: int, col: int) -> list:
@@ -40,8 +50,31 @@ def encode_cell_id(dim: int, row: int, col: int) -> list:
 
     :returns: a list of binary representation
     """
-    g_dim = get_encoding_vector(dim)
+    g_dim = _encoding_table(dim)
 
-    rep = g_dim[row] + g_dim[col]
+    rep = list(g_dim[row] + g_dim[col])
 
     return rep
+
+
+def encode_cells(dim: int, rows, cols) -> np.ndarray:
+    """ Get grey encoding binary representations of many cells (rows[k], cols[k]) at once.
+    Row k of the result is `encode_cell_id(dim, rows[k], cols[k])`.
+
+    :param int dim: dimension of the grid
+    :param rows: array-like of row indices in [0, 2 ** dim)
+    :param cols: array-like of col indices in [0, 2 ** dim)
+
+    :returns: a 2-D uint8 array of shape (number of cells, 2 * dim)
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    assert rows.shape == cols.shape and rows.ndim == 1, "Error: rows and cols must be 1-D arrays of the same size"
+    assert np.all((rows >= 0) & (rows < 2 ** dim)) and np.all((cols >= 0) & (cols < 2 ** dim)), \
+        "Error: rows and cols must be in [0, 2 ** dim)"
+
+    shifts = np.arange(dim - 1, -1, -1, dtype=np.int64)
+    bits = np.empty((rows.shape[0], 2 * dim), dtype=np.uint8)
+    bits[:, :dim] = (gray_code(rows)[:, None] >> shifts) & 1
+    bits[:, dim:] = (gray_code(cols)[:, None] >> shifts) & 1
+    return bits
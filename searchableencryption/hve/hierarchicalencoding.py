@@ -3,7 +3,14 @@ Section 3.2 of 'An Efficient Privacy-Preserving System for Monitoring Mobile Use
 Making Searchable Encryption Practical'
 
 Link: https://dl.acm.org/citation.cfm?id=2557559
+
+For a grid of dim x dim with dim a power of 2, the encoding interleaves the bits of col and row,
+most significant first: (col bit, row bit) for every level of the hierarchy.
+The bulk functions `encode_cells` and `decode_cells` work on this interleaving directly.
 """
+import numpy as np
+
+from searchableencryption.hve.util import WILDCARD
 
 
 def encode_cell_id(dim: int, row: int, col: int) -> list:
@@ -35,3 +42,94 @@ def encode_cell_id(dim: int, row: int, col: int) -> list:
         rep.extend(encode_cell_id(mid, row, col))
 
     return rep
+
+
+def num_levels(dim: int) -> int:
+    """ Get the number of levels of the hierarchy of a grid of dim x dim
+
+    :param int dim: dimension of the grid, a power of 2 greater than 1
+
+    :returns: the number of levels, each level is encoded with 2 bits
+    """
+    levels = dim.bit_length() - 1
+    assert levels > 0 and dim == 1 << levels, "Error: dimension of the grid must be a power of 2 greater than 1"
+    return levels
+
+
+def encode_cells(dim: int, rows, cols) -> np.ndarray:
+    """ Get hierarchical encoding binary representations of many cells (rows[k], cols[k]) at once.
+    Row k of the result is `encode_cell_id(dim, rows[k], cols[k])`.
+
+    :param int dim: dimension of the grid, a power of 2
+    :param rows: array-like of row indices in [0, dim)
+    :param cols: array-like of col indices in [0, dim)
+
+    :returns: a 2-D uint8 array of shape (number of cells, 2 * number of levels)
+    """
+    levels = num_levels(dim)
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    assert rows.shape == cols.shape and rows.ndim == 1, "Error: rows and cols must be 1-D arrays of the same size"
+    assert np.all((rows >= 0) & (rows < dim)) and np.all((cols >= 0) & (cols < dim)), \
+        "Error: rows and cols must be in [0, dim)"
+
+    shifts = np.arange(levels - 1, -1, -1, dtype=np.int64)
+    bits = np.empty((rows.shape[0], 2 * levels), dtype=np.uint8)
+    bits[:, 0::2] = (cols[:, None] >> shifts) & 1
+    bits[:, 1::2] = (rows[:, None] >> shifts) & 1
+    return bits
+
+
+def decode_cells(dim: int, bits) -> tuple:
+    """ Get the cells of many hierarchical encoding binary representations, the inverse of `encode_cells`
+
+    :param int dim: dimension of the grid, a power of 2
+    :param bits: 2-D array-like of shape (number of cells, 2 * number of levels)
+
+    :returns: (rows, cols) arrays of row and col indices
+    """
+    levels = num_levels(dim)
+    bits = np.asarray(bits, dtype=np.int64)
+    assert bits.ndim == 2 and bits.shape[1] == 2 * levels, "Error: incorrect shape of binary representations"
+    assert np.all((bits == 0) | (bits == 1)), "Error: binary representations must only contain 0 and 1"
+
+    weights = np.int64(1) << np.arange(levels - 1, -1, -1, dtype=np.int64)
+    return (bits[:, 1::2] @ weights, bits[:, 0::2] @ weights)
+
+
+def decode_cell_id(dim: int, rep: list) -> tuple:
+    """ Get the cell (row, col) of a hierarchical encoding binary representation,
+    the inverse of `encode_cell_id`
+
+    :param int dim: dimension of the grid, a power of 2
+    :param list rep: binary representation
+
+    :returns: (row, col) pair
+    """
+    assert len(rep) == 2 * num_levels(dim), "Error: incorrect length of binary representation"
+
+    row = 0
+    col = 0
+    for level in range(len(rep) // 2):
+        col = (col << 1) | int(rep[2 * level])
+        row = (row << 1) | int(rep[2 * level + 1])
+    return (row, col)
+
+
+def encode_prefix(dim: int, row: int, col: int, level: int) -> list:
+    """ Get the query which matches every cell in the same block as cell (row, col)
+    at a level of the hierarchy, i.e. the block of (dim / 2 ** level) x (dim / 2 ** level) cells.
+    The first 2 * level bits of the binary representation are kept and the others are `WILDCARD`.
+
+    :param int dim: dimension of the grid, a power of 2
+    :param int row: row index
+    :param int col: col index
+    :param int level: level of the hierarchy, from 0 (whole grid) to the number of levels (the cell itself)
+
+    :returns: a query with 0, 1, or `WILDCARD`
+    """
+    levels = num_levels(dim)
+    assert 0 <= level <= levels, "Error: level must be in [0, number of levels]"
+
+    rep = encode_cell_id(dim, row, col)
+    return rep[:2 * level] + [WILDCARD] * (2 * (levels - level))
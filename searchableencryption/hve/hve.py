@@ -11,14 +11,18 @@ Even though in this implementation, the same group object is passed around
 one can easily adapt to only pass the parameters around
 """
 
-from charm.toolbox.integergroup import IntegerGroup
+import os
+from concurrent.futures import ProcessPoolExecutor
 
-from searchableencryption.hve.util import PARAM_KEY_N0, PARAM_KEY_N1, get_unit_element
+from searchableencryption.hve import tokenset
+from searchableencryption.hve.util import PARAM_KEY_N0, PARAM_KEY_N1, get_unit_element, is_unit_element, \
+    fixed_base
 from searchableencryption.toolbox.pairinggroup \
-    import PairingGroup, G1, GT, pair, convert_params_to_string
+    import PairingGroup, GroupDict, GroupRecord, Prepared, G1, GT, pair, get_group
+from searchableencryption.toolbox.randomness import random_exponent, random_exponents
 
 
-def setup(width: int, group_param: dict):
+def setup(width: int, group_param: dict, max_workers: int = 0):
     """
     Performs the setup algorithm for HVE.
 
@@ -27,12 +31,20 @@ def setup(width: int, group_param: dict):
     - contain values for 'p', 'n', 'l'
     - contain 2 primes 'n0', 'n1' where n = n0 * n1
 
+    One random generator of G_p and one of G_q are sampled with fixed-base pre-computation tables,
+    and every other element of G_p or G_q is a fixed-base power of them with a random exponent,
+    instead of a variable-base exponentiation of a random element of G1.
+
     :param int width: the length of attribute vector
     :param dict group_param: group parameters
+    :param int max_workers: number of worker processes to spread the components of positions over,
+        0 to compute them in this process, or None for the number of processors of the machine
 
     :returns: (publicKey, secretKey) pair
     """
-    int_group = IntegerGroup()
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    assert max_workers >= 0, "Error: max_workers must be non-negative"
 
     p = group_param[PARAM_KEY_N0]
     q = group_param[PARAM_KEY_N1]
@@ -41,109 +53,250 @@ def setup(width: int, group_param: dict):
     group_param_copy.pop(PARAM_KEY_N0, None)
     group_param_copy.pop(PARAM_KEY_N1, None)
 
-    group = PairingGroup()
-    group.init_from_str(convert_params_to_string(group_param_copy))
-
-    g_q = random_gq(group, p, q)
-    a = int(random_zr(int_group, p))
-
-    u = {}
-    h = {}
-    w = {}
-    for i in range(width):
-        u[i] = random_gp(group, p, q)
-        h[i] = random_gp(group, p, q)
-        w[i] = random_gp(group, p, q)
-
-    g = random_gp(group, p, q)
-    v = random_gp(group, p, q)
+    group = get_group(group_param_copy)
+
+    generator_p = fixed_base(random_gp(group, p, q))
+    generator_q = fixed_base(random_gq(group, p, q))
+
+    g_q = generator_q ** random_exponent(q)
+    a = random_exponent(p)
+
+    if max_workers == 0 or width == 0:
+        components = _setup_positions(generator_p, generator_q, p, q, range(width))
+    else:
+        chunk_size = -(-width // max_workers)
+        chunks = [range(start, min(start + chunk_size, width)) for start in range(0, width, chunk_size)]
+        generators = GroupDict(group, {'p': generator_p, 'q': generator_q})
+        with ProcessPoolExecutor(max_workers=max_workers,
+                                 initializer=_init_setup_worker,
+                                 initargs=(generators,)) as executor:
+            components = {key: {} for key in ['u', 'h', 'w', 'U', 'H', 'W']}
+            for chunk_components in executor.map(_setup_worker, [p] * len(chunks), [q] * len(chunks), chunks):
+                for key, values in chunk_components.items():
+                    components[key].update(values)
+
+    (g_exp, v_exp) = random_exponents(p, 2)
+    g = generator_p ** g_exp
+    v = generator_p ** v_exp
     assert g.initPP(), "ERROR: Failed to init pre-computation table for g."
     assert v.initPP(), "ERROR: Failed to init pre-computation table for v."
 
-    V = v * random_gq(group, p, q)
+    V = v * (generator_q ** random_exponent(q))
     A = pair(g, v) ** a
-    U = {}
-    H = {}
-    W = {}
-    for i in range(width):
-        U[i] = u[i] * random_gq(group, p, q)
-        H[i] = h[i] * random_gq(group, p, q)
-        W[i] = w[i] * random_gq(group, p, q)
-
-    pk = {'group': group,
-          'g_q': g_q,
-          'V': V,
-          'A': A,
-          'U': U,
-          'H': H,
-          'W': W}
-
-    sk = {'group': group,
-          'g_q': g_q,
-          'a': a,
-          'u': u,
-          'h': h,
-          'w': w,
-          'g': g,
-          'v': v,
-          'p': p,
-          'q': q}
+    u = components['u']
+    h = components['h']
+    w = components['w']
+    U = components['U']
+    H = components['H']
+    W = components['W']
+
+    pk = GroupDict(group,
+                   {'group': group,
+                    'g_q': g_q,
+                    'V': V,
+                    'A': A,
+                    'U': U,
+                    'H': H,
+                    'W': W})
+
+    sk = GroupDict(group,
+                   {'group': group,
+                    'g_q': g_q,
+                    'a': a,
+                    'u': u,
+                    'h': h,
+                    'w': w,
+                    'g': g,
+                    'v': v,
+                    'p': p,
+                    'q': q})
 
     return (pk, sk)
 
 
-def encrypt(pk, I, M=None):
-    """ Encrypt a index vector I with values of components as 0 or 1, with optional message M
+def extend(pk, sk, new_width: int):
+    """ Extend the width of a key pair by appending fresh components `u`, `h`, `w` and `U`, `H`, `W`
+    for the new positions, keeping the components of the existing positions.
 
-    The message is an element in GT. If it is not provided, the identity element of GT is used
+    Cipher texts encrypted under the original keys remain queryable
+    by tokens of the extended key which only fix original positions (i.e. wildcards at the new positions).
+    The original keys are not modified.
 
     :param pk: public key
+    :param sk: secret key
+    :param int new_width: the new length of attribute vector
+    :returns: (publicKey, secretKey) pair of width `new_width`
+    """
+    width = len(pk['U'])
+    assert new_width >= width, "Error: the new width is smaller than the width of the key"
+
+    # g and g_q generate G_p and G_q
+    components = _setup_positions(fixed_base(sk['g']), fixed_base(sk['g_q']), sk['p'], sk['q'],
+                                  range(width, new_width))
+
+    new_pk = GroupDict(pk['group'], pk)
+    new_sk = GroupDict(sk['group'], sk)
+    for key in ['U', 'H', 'W']:
+        new_pk[key] = {**pk[key], **components[key]}
+    for key in ['u', 'h', 'w']:
+        new_sk[key] = {**sk[key], **components[key]}
+
+    return (new_pk, new_sk)
+
+
+def _setup_positions(generator_p, generator_q, p, q, positions) -> dict:
+    """ Sample the components `u`, `h`, `w` in G_p and `U`, `H`, `W` of the public key for some positions
+
+    :param generator_p: generator of G_p with a fixed-base pre-computation table
+    :param generator_q: generator of G_q with a fixed-base pre-computation table
+    :param p: order of G_p
+    :param q: order of G_q
+    :param positions: positions of the components
+    :returns: dict of dicts of components keyed by position
+    """
+    exponents_p = random_exponents(p, 3 * len(positions))
+    exponents_q = random_exponents(q, 3 * len(positions))
+    components = {key: {} for key in ['u', 'h', 'w', 'U', 'H', 'W']}
+    for k, i in enumerate(positions):
+        for j, (key_p, key) in enumerate([('u', 'U'), ('h', 'H'), ('w', 'W')]):
+            element = generator_p ** exponents_p[3 * k + j]
+            components[key_p][i] = element
+            components[key][i] = element * (generator_q ** exponents_q[3 * k + j])
+    return components
+
+
+_worker_generators = None
+
+
+def _init_setup_worker(generators):
+    """ Build fixed-base pre-computation tables of the subgroup generators in a worker process of `setup`
+    """
+    global _worker_generators
+    _worker_generators = GroupDict(generators.group,
+                                   {'p': fixed_base(generators['p']), 'q': fixed_base(generators['q'])})
+
+
+def _setup_worker(p, q, positions):
+    components = _setup_positions(_worker_generators['p'], _worker_generators['q'], p, q, positions)
+    return GroupDict(_worker_generators.group, components)
+
+
+def encrypt(pk, I, M=None, pool=None):
+    """ Encrypt a index vector I with values of components as 0 or 1, with optional message M
+
+    The message is an element in GT. If it is not provided, the identity element of GT is used.
+    If `pk` is a `PreparedPublicKey`, its fixed-base pre-computation tables are used.
+    If a `BlindingPool` is provided, blinding factors are taken from the pool.
+
+    :param pk: public key or prepared public key
     :param I: a index vector
     :param M: message
+    :param BlindingPool pool: optional pool of pre-computed blinding factors
     :returns: cipher text for I (and M if any)
     """
-    int_group = IntegerGroup()
     g_q = pk['g_q']
     group = pk['group']
     n = group.order()
-    s = int(random_zr(int_group, n))
+    s = random_exponent(n)
     if M is None:
         M = get_unit_element(group, GT)
     C_prime = (pk['A'] ** s) * M
 
-    Z = g_q ** int(random_zr(int_group, n))
-    C_0 = (pk['V'] ** s) * Z
+    num_blinding = 2 * len(I) + 1
+    if pool is not None:
+        Z = pool.take(num_blinding)
+    else:
+        Z = [g_q ** z for z in random_exponents(n, num_blinding)]
 
-    C_1 = {}
-    C_2 = {}
+    C_0 = (pk['V'] ** s) * Z[0]
+
+    C_1 = []
+    C_2 = []
     U = pk['U']
     H = pk['H']
     W = pk['W']
+    prepared = isinstance(pk, PreparedPublicKey)
     for i in range(len(I)):
-        Z_1_i = g_q ** int(random_zr(int_group, n))
-        C_1[i] = (((U[i] ** I[i]) * H[i]) ** s) * Z_1_i
+        if prepared:
+            base = pk.UH[i] if I[i] == 1 else H[i]
+        else:
+            base = (U[i] ** I[i]) * H[i]
+
+        C_1.append((base ** s) * Z[2 * i + 1])
+        C_2.append((W[i] ** s) * Z[2 * i + 2])
+
+    return Ciphertext(group, C_prime=C_prime, C_0=C_0, C_1=tuple(C_1), C_2=tuple(C_2))
 
-        Z_2_i = g_q ** int(random_zr(int_group, n))
-        C_2[i] = (W[i] ** s) * Z_2_i
 
-    C = {'C_prime': C_prime,
-         'C_0': C_0,
-         'C_1': C_1,
-         'C_2': C_2}
+class Ciphertext(GroupRecord):
+    """ Cipher text of HVE. `C_1` and `C_2` are tuples indexed by position
+    """
+    __slots__ = ('C_prime', 'C_0', 'C_1', 'C_2')
+    _fields = __slots__
+
+
+def encrypt_many(pk, indices: list, messages: list = None, pool=None) -> list:
+    """ Encrypt many index vectors under the same public key.
+    The public key is prepared once (see `PreparedPublicKey`) if it is not prepared yet.
+
+    :param pk: public key or prepared public key
+    :param list indices: list of index vectors
+    :param list messages: optional list of messages, one for each index vector
+    :param BlindingPool pool: optional pool of pre-computed blinding factors
+    :returns: list of cipher texts
+    """
+    if not isinstance(pk, PreparedPublicKey):
+        pk = PreparedPublicKey(pk)
+
+    if messages is None:
+        messages = [None] * len(indices)
+    assert len(messages) == len(indices), "Error: number of messages and indices are different"
 
-    return C
+    return [encrypt(pk, I, M, pool=pool) for I, M in zip(indices, messages)]
 
 
-def gen_token(sk, I_star):
+class PreparedPublicKey(Prepared):
+    """ Public key with fixed-base tables (see `fixed_base`) for the bases of `encrypt`:
+    `g_q`, `V`, `A` and, per position i, `H[i]` (bit 0), `U[i] * H[i]` (bit 1) and `W[i]`.
+    """
+    _prepared_keys = ('g_q', 'V', 'A', 'H', 'W')
+
+    def __init__(self, pk):
+        """ Build pre-computation tables for public key `pk`
+
+        :param pk: public key
+        """
+        super().__init__(pk)
+        self.g_q = fixed_base(pk['g_q'])
+        self.V = fixed_base(pk['V'])
+        self.A = fixed_base(pk['A'])
+
+        U = pk['U']
+        H = pk['H']
+        W = pk['W']
+        self.H = {}
+        self.UH = {}
+        self.W = {}
+        for i in range(len(U)):
+            self.H[i] = fixed_base(H[i])
+            self.UH[i] = fixed_base(U[i] * H[i])
+            self.W[i] = fixed_base(W[i])
+
+
+def gen_token(sk, I_star, sparse=False):
     """ Create search token for a given query I_star.
     Elements of I_star is 0, 1, or a `WILDCARD`.
 
-    :param sk: secret key
+    A sparse token only stores `K_1` and `K_2` for the fixed (non-wildcard) positions,
+    in dicts keyed by position, together with the list of these positions in `indices`.
+    Both formats are accepted by `query`.
+    If `sk` is a `PreparedSecretKey`, its fixed-base pre-computation tables are used.
+
+    :param sk: secret key or prepared secret key
     :param I_star: query
+    :param bool sparse: whether or not to create a sparse token
     :returns: search token
     """
-    intGroup = IntegerGroup()
-
     u = sk['u']
     h = sk['h']
     w = sk['w']
@@ -152,34 +305,101 @@ def gen_token(sk, I_star):
     a = sk['a']
     p = sk['p']
 
-    K_0 = g ** a
+    fixed = [i for i in range(len(I_star)) if I_star[i] == 0 or I_star[i] == 1]
+    positions = fixed if sparse else range(len(I_star))
+
+    prepared = isinstance(sk, PreparedSecretKey)
+    K_0 = sk.g_a if prepared else g ** a
+    r = random_exponents(p, 2 * len(positions))
     r_1 = {}
     r_2 = {}
-    for i in range(len(I_star)):
-        r_1[i] = int(random_zr(intGroup, p))
-        r_2[i] = int(random_zr(intGroup, p))
-
-    for i in range(len(I_star)):
-        if I_star[i] != 0 and I_star[i] != 1:
-            continue
-        tmp = u[i] ** I_star[i]
-        tmp = tmp * h[i]
+    for k, i in enumerate(positions):
+        r_1[i] = r[2 * k]
+        r_2[i] = r[2 * k + 1]
+
+    for i in fixed:
+        if prepared:
+            tmp = sk.uh[i] if I_star[i] == 1 else h[i]
+        else:
+            tmp = u[i] ** I_star[i]
+            tmp = tmp * h[i]
         tmp = tmp ** r_1[i]
         tmp = tmp * (w[i] ** r_2[i])
         K_0 = K_0 * tmp
 
     K_1 = {}
     K_2 = {}
-    for i in range(len(I_star)):
+    for i in positions:
         K_1[i] = v ** r_1[i]
         K_2[i] = v ** r_2[i]
 
-    token = {'I_star': I_star,
-             'K_0': K_0,
-             'K_1': K_1,
-             'K_2': K_2}
+    if sparse:
+        return Token(sk['group'], I_star=I_star, K_0=K_0, K_1=K_1, K_2=K_2, indices=fixed)
+
+    return Token(sk['group'], I_star=I_star, K_0=K_0,
+                 K_1=tuple(K_1[i] for i in positions), K_2=tuple(K_2[i] for i in positions))
+
+
+class Token(GroupRecord):
+    """ Search token of HVE. `K_1` and `K_2` are tuples indexed by position,
+    or dicts keyed by the fixed positions listed in `indices` for a sparse token
+    """
+    __slots__ = ('I_star', 'K_0', 'K_1', 'K_2', 'indices')
+    _fields = __slots__
+
 
-    return token
+def gen_tokens(sk, I_stars: list, sparse=False, max_workers: int = 0) -> list:
+    """ Create search tokens for many queries with a `PreparedSecretKey`, see `tokenset.gen_tokens`
+
+    :param sk: secret key or prepared secret key
+    :param list I_stars: list of queries
+    :param bool sparse: whether or not to create sparse tokens
+    :param int max_workers: number of worker processes to spread token generation over,
+        or 0 to generate tokens in this process
+    :returns: list of search tokens
+    """
+    return tokenset.gen_tokens(PreparedSecretKey, gen_token, sk, I_stars, max_workers, sparse=sparse)
+
+
+class PreparedSecretKey(Prepared):
+    """ Secret key with fixed-base tables for the bases of `gen_token`:
+    `v` and, per position i, `h[i]` (bit 0), `u[i] * h[i]` (bit 1) and `w[i]`. `g ** a` is computed once.
+    """
+    _prepared_keys = ('v', 'h', 'w')
+
+    def __init__(self, sk):
+        """ Build pre-computation tables for secret key `sk`
+
+        :param sk: secret key
+        """
+        super().__init__(sk)
+        self.v = fixed_base(sk['v'])
+        self.g_a = sk['g'] ** sk['a']
+
+        u = sk['u']
+        h = sk['h']
+        w = sk['w']
+        self.h = {}
+        self.uh = {}
+        self.w = {}
+        for i in range(len(u)):
+            self.h[i] = fixed_base(h[i])
+            self.uh[i] = fixed_base(u[i] * h[i])
+            self.w[i] = fixed_base(w[i])
+
+
+def fixed_positions(token) -> list:
+    """ Get the fixed (non-wildcard) positions of a token
+
+    :param token: search token, either sparse or not
+    :returns: list of fixed positions
+    """
+    if isinstance(token, PreparedToken):
+        return token.indices
+    if 'indices' in token:
+        return token['indices']
+    I_star = token['I_star']
+    return [i for i in range(len(I_star)) if I_star[i] == 0 or I_star[i] == 1]
 
 
 def query(token, cipher, predicate_only=False, group=None):
@@ -187,6 +407,134 @@ def query(token, cipher, predicate_only=False, group=None):
     If evaluating predicate only
     (i.e. only check if `token` holds for ciphertext `cipher`
     and do not care about message in the cipher text),
+    the output of decryption will be compared to the identity element of GT in the group.
+
+    All pairings, including `pair(C_0, K_0)`, are evaluated as a single multi-pairing
+    so that only one final exponentiation is needed for the whole token.
+    `pair(C_0, K_0)` is moved to the product as `pair(C_0, K_0 ** -1)`.
+
+    :param token: search token, either sparse or not, or prepared token
+    :param cipher: cipher text
+    :param bool predicate_only: whether or not only evaluates predicate
+    :param PairingGroup group: the pairing group, the group of the token is used if not provided
+    :returns: if predicateOnly, return whether the predicate represented by `token`
+              holds for cipher text `cipher`;
+              otherwise, return the decrypted message
+              (which is the orginal message if the decryption succeeded
+              or just a random element in GT)
+    """
+    if group is None:
+        group = token['group']
+
+    M_prime = cipher['C_prime'] * _pair_prod(token, cipher, group)
+
+    if predicate_only:
+        return is_unit_element(group, M_prime, GT)
+
+    return M_prime
+
+
+def match(token, cipher) -> bool:
+    """ Evaluates only whether the predicate represented by `token` holds for ciphertext `cipher`,
+    i.e. `query(token, cipher, predicate_only=True)` without the message or the group argument.
+
+    The predicate holds if and only if
+    `C_prime * pair(C_0, K_0 ** -1) * prod_i(pair(C_1[i], K_1[i]) * pair(C_2[i], K_2[i]))`
+    is the identity of GT, where i runs over the fixed positions of the token.
+    This is checked with a single multi-pairing and one GT multiplication,
+    without any GT inversion or division.
+
+    :param token: search token, either sparse or not, or prepared token
+    :param cipher: cipher text
+    :returns: whether the predicate represented by `token` holds for cipher text `cipher`
+    """
+    group = token['group']
+    return is_unit_element(group, cipher['C_prime'] * _pair_prod(token, cipher, group), GT)
+
+
+def match_any(tokens: list, cipher) -> bool:
+    """ Evaluates whether the predicate of any of the tokens holds for ciphertext `cipher`, see `tokenset.match_any`
+
+    :param list tokens: list of search tokens or prepared tokens
+    :param cipher: cipher text
+    :returns: whether the predicate of any of the tokens holds
+    """
+    return tokenset.match_any(match, tokens, cipher)
+
+
+def match_any_scan(tokens: list, ciphertexts: list) -> list:
+    """ Find the cipher texts for which the predicate of any of the tokens holds, see `tokenset.match_any_scan`
+
+    :param list tokens: list of search tokens or prepared tokens
+    :param list ciphertexts: list of cipher texts
+    :returns: sorted list of indices of matched cipher texts
+    """
+    return tokenset.match_any_scan(match, tokens, ciphertexts, prepare_token)
+
+
+def _pair_prod(token, cipher, group):
+    """ Multi-pairing of `pair(C_0, K_0 ** -1)` and `pair(C_1[i], K_1[i]) * pair(C_2[i], K_2[i])`
+    for every fixed position i of the token
+    """
+    token = PreparedToken.prepare(token)
+
+    C_1 = cipher['C_1']
+    C_2 = cipher['C_2']
+    lhs = [cipher['C_0']]
+    for i in token.indices:
+        lhs.append(C_1[i])
+        lhs.append(C_2[i])
+    return group.pair_prod(lhs, token.rhs)
+
+
+def prepare_token(token):
+    """ Prepare a token to be evaluated against many cipher texts, see `PreparedToken`
+
+    :param token: search token, either sparse or not, or prepared token
+    :returns: prepared token
+    """
+    return PreparedToken.prepare(token)
+
+
+class PreparedToken(Prepared):
+    """ Search token with its fixed positions and the token side of the multi-pairing of `query`:
+    `K_0 ** -1` followed by `K_1[i]` and `K_2[i]` of every fixed position i.
+    Charm does not expose the pairing pre-processing of PBC (`pairing_pp_t`),
+    which PBC cannot combine with a multi-pairing anyway,
+    so the Miller loops themselves are not pre-computed.
+    """
+
+    def __init__(self, token):
+        """ Prepare search token `token`
+
+        :param token: search token, either sparse or not
+        """
+        super().__init__(token)
+        self.indices = tuple(fixed_positions(token))
+
+        K_1 = token['K_1']
+        K_2 = token['K_2']
+        self.rhs = [token['K_0'] ** -1]
+        for i in self.indices:
+            self.rhs.append(K_1[i])
+            self.rhs.append(K_2[i])
+
+    def memory_footprint(self) -> int:
+        """ Memory footprint of the prepared arguments, i.e. their size in bytes in uncompressed form
+
+        :returns: size in bytes
+        """
+        return sum([self.group.element_length(elem, compression=False) for elem in self.rhs])
+
+
+def query_reference(token, cipher, predicate_only=False, group=None):
+    """ Reference implementation of `query` which evaluates every pairing separately.
+    It is kept to cross-check `query`.
+
+    Evaluates if the predicate represented by `token` holds for ciphertext `cipher`.
+    If evaluating predicate only
+    (i.e. only check if `token` holds for ciphertext `cipher`
+    and do not care about message in the cipher text),
     the group should be passed because the output of decryption will be compared
     to the identity element of GT in the group
 
@@ -231,9 +579,3 @@ def random_gp(group: PairingGroup, p, q):
 
 def random_gq(group: PairingGroup, p, q):
     return group.random(G1) ** p
-
-
-def random_zr(group: IntegerGroup, r):
-    """ Generate a random element in Zr
-    """
-    return group.random(max=int(r))
@@ -1,18 +1,27 @@
 """ Helper module to run HVE scheme
 """
 from searchableencryption.hve import util
+from searchableencryption.hve.searchengine import SearchEngine
+from searchableencryption.hve.tokenset import iter_matches  # noqa: F401
 
 
 def run_hve_multiple(hve_quadruple: tuple,
                      indices: list,
                      queries: list,
-                     groupParam: dict):
-    """ Run HVE with multiple indices and queries
+                     groupParam: dict,
+                     max_workers: int = 0,
+                     chunk_size: int = 256,
+                     verbose: bool = False):
+    """ Run HVE with multiple indices and queries.
+    Tokens are evaluated against cipher texts with a `SearchEngine`.
 
     :param tuple hve_quadruple: quadruple of HVE functions (setup, encrypt, gen_token, query)
     :param list indices: list of indices with 0 or 1 entries where 1s indicates locations
     :param list queries: list of queries with 0, 1, or `WILDCARD`
     :param dict groupParam: group parameters
+    :param int max_workers: number of worker processes of the search engine, 0 to evaluate in this process
+    :param int chunk_size: number of cipher texts sent to a worker at a time
+    :param bool verbose: whether or not to print the progress of the steps
 
     :returns: list of list of matched indices of each query
     """
@@ -22,30 +31,62 @@ def run_hve_multiple(hve_quadruple: tuple,
     query = hve_quadruple[3]
 
     width = util.check_size(indices, queries)
-    print('width:', width)
+    if verbose:
+        print('width:', width)
 
     (pk, sk) = setup(width=width, group_param=groupParam)
-    print('Done setup')
+    if verbose:
+        print('Done setup')
 
     C = []
 
     for index in indices:
         C.append(encrypt(pk, index))
-    print('Done encrypt')
+    if verbose:
+        print('Done encrypt')
 
-    matches = []
-    for qi, I_star in enumerate(queries):
-        token = gen_token(sk, I_star)
+    tokens = []
+    for I_star in queries:
+        tokens.append(gen_token(sk, I_star))
+    if verbose:
         print('Done gen token')
 
-        matched_items = list()
+    with SearchEngine(query, pk['group'], max_workers=max_workers, chunk_size=chunk_size) as engine:
+        matches = engine.search(tokens, C)
 
-        for ci, cipher in enumerate(C):
-            matched = query(token, cipher, predicate_only=True, group=pk['group'])
-            if matched:
-                # matched
-                matched_items.append(ci)
+    return matches
+
+
+def iter_hve_multiple(hve_quadruple: tuple,
+                      indices,
+                      queries: list,
+                      groupParam: dict,
+                      max_workers: int = 0,
+                      chunk_size: int = 256):
+    """ Run HVE with multiple indices and queries, and yield the matches as they are found.
+    Indices are encrypted one at a time while the cipher texts are evaluated,
+    so the cipher texts are never all in memory.
+
+    :param tuple hve_quadruple: quadruple of HVE functions (setup, encrypt, gen_token, query)
+    :param indices: iterable of indices with 0 or 1 entries where 1s indicates locations
+    :param list queries: list of queries with 0, 1, or `WILDCARD`
+    :param dict groupParam: group parameters
+    :param int max_workers: number of worker processes of the search engine, 0 to evaluate in this process
+    :param int chunk_size: number of cipher texts sent to a worker at a time
+
+    :returns: generator of (index position, query position) pairs of matches
+    """
+    setup = hve_quadruple[0]
+    encrypt = hve_quadruple[1]
+    gen_token = hve_quadruple[2]
+    query = hve_quadruple[3]
+
+    width = util.check_size([], queries)
+    (pk, sk) = setup(width=width, group_param=groupParam)
+    tokens = [gen_token(sk, I_star) for I_star in queries]
+
+    with SearchEngine(query, pk['group'], max_workers=max_workers, chunk_size=chunk_size) as engine:
+        for pair in engine.iter_search(tokens, (encrypt(pk, index) for index in indices)):
+            yield pair
 
-        matches.append(matched_items)
 
-    return matches
@@ -3,32 +3,45 @@
 Link: https://dl.acm.org/citation.cfm?id=1431889
 
 """
-from searchableencryption.hve.util import get_unit_element
+from searchableencryption.hve import tokenset
+from searchableencryption.hve.util import get_unit_element, is_unit_element, fixed_base
 from searchableencryption.toolbox.pairinggroup \
-    import PairingGroup, ZR, G1, GT, pair, convert_params_to_string
+    import GroupDict, GroupRecord, Prepared, ZR, G1, G2, GT, pair, get_group, load_group
 
 
-def setup(width: int, group_param: dict):
+def setup(width: int, group_param):
     """
     Performs the setup algorithm for HVE.
 
-    The group params should:
+    The group params should either be a dict of PBC parameters:
     - 'type': 'a'
     - contain values for 'q', 'h', 'r', 'exp2', 'exp1', 'sign1', 'sign0'
 
+    or the ID of a curve of Charm (see `PairingGroup.init_from_id`),
+    e.g. 'MNT224' with PBC or 'BN254' with RELIC.
+    With an asymmetric curve, cipher texts and the public key are in G1
+    and tokens are in G2, generated by the `g` of the secret key.
+
     :param int width: the length of attribute vector
-    :param dict group_param: group parameters
+    :param group_param: group parameters, or the ID of a curve
 
     :returns: (public_key, secret_key) pair
     """
-    group = PairingGroup()
-    group.init_from_str(convert_params_to_string(group_param))
+    if isinstance(group_param, str):
+        group = load_group('id', group_param)
+    else:
+        group = get_group(group_param)
 
     g = group.random(G1)
     assert g.initPP(), "ERROR: Failed to init pre-computation table for g."
+    if group.is_symmetric():
+        g_token = g
+    else:
+        g_token = group.random(G2)
+        assert g_token.initPP(), "ERROR: Failed to init pre-computation table for g."
 
     y = group.random(ZR)
-    Y = pair(g, g) ** y
+    Y = pair(g, g_token) ** y
 
     t = dict()
     v = dict()
@@ -48,21 +61,23 @@ def setup(width: int, group_param: dict):
         m[i] = group.random(ZR)
         M[i] = g ** m[i]
 
-    pk = {'group': group,
-          'g': g,
-          'Y': Y,
-          'T': T,
-          'V': V,
-          'R': R,
-          'M': M}
-
-    sk = {'group': group,
-          'g': g,
-          'y': y,
-          't': t,
-          'v': v,
-          'r': r,
-          'm': m}
+    pk = GroupDict(group,
+                   {'group': group,
+                    'g': g,
+                    'Y': Y,
+                    'T': T,
+                    'V': V,
+                    'R': R,
+                    'M': M})
+
+    sk = GroupDict(group,
+                   {'group': group,
+                    'g': g_token,
+                    'y': y,
+                    't': t,
+                    'v': v,
+                    'r': r,
+                    'm': m})
 
     return (pk, sk)
 
@@ -70,9 +85,10 @@ def setup(width: int, group_param: dict):
 def encrypt(pk, x, message=None):
     """ Encrypt a vector x with values of components as 0 or 1, with optional message
 
-    The message is an element in GT. If it is not provided, the identity element of GT is used
+    The message is an element in GT. If it is not provided, the identity element of GT is used.
+    If `pk` is a `PreparedPublicKey`, its fixed-base pre-computation tables are used.
 
-    :param pk: public key
+    :param pk: public key or prepared public key
     :param x: a vector
     :param message: message
     :returns: cipher text for x (and message if any)
@@ -86,8 +102,8 @@ def encrypt(pk, x, message=None):
     omega = (pk['Y'] ** (-s)) * message
     C_0 = g ** s
 
-    X = dict()
-    W = dict()
+    X = []
+    W = []
     T = pk['T']
     V = pk['V']
     R = pk['R']
@@ -95,25 +111,68 @@ def encrypt(pk, x, message=None):
     for i in range(len(x)):
         s_i = group.random(ZR)
         if x[i] == 1:
-            X[i] = T[i] ** (s - s_i)
-            W[i] = V[i] ** s_i
+            X.append(T[i] ** (s - s_i))
+            W.append(V[i] ** s_i)
         else:
-            X[i] = R[i] ** (s - s_i)
-            W[i] = M[i] ** s_i
+            X.append(R[i] ** (s - s_i))
+            W.append(M[i] ** s_i)
+
+    return Ciphertext(group, omega=omega, C_0=C_0, X=tuple(X), W=tuple(W))
+
+
+class Ciphertext(GroupRecord):
+    """ Cipher text of HVE. `X` and `W` are tuples indexed by position
+    """
+    __slots__ = ('omega', 'C_0', 'X', 'W')
+    _fields = __slots__
+
+
+def encrypt_many(pk, indices: list, messages: list = None) -> list:
+    """ Encrypt many vectors under the same public key.
+    The public key is prepared once (see `PreparedPublicKey`) if it is not prepared yet.
 
-    cipher = {'omega': omega,
-              'C_0': C_0,
-              'X': X,
-              'W': W}
+    :param pk: public key or prepared public key
+    :param list indices: list of vectors
+    :param list messages: optional list of messages, one for each vector
+    :returns: list of cipher texts
+    """
+    if not isinstance(pk, PreparedPublicKey):
+        pk = PreparedPublicKey(pk)
+
+    if messages is None:
+        messages = [None] * len(indices)
+    assert len(messages) == len(indices), "Error: number of messages and indices are different"
 
-    return cipher
+    return [encrypt(pk, x, message) for x, message in zip(indices, messages)]
+
+
+class PreparedPublicKey(Prepared):
+    """ Public key with fixed-base tables (see `fixed_base`) for the bases of `encrypt`:
+    `g`, `Y` and, per position i, `T[i]` and `V[i]` (bit 1) and `R[i]` and `M[i]` (bit 0).
+    """
+    _prepared_keys = ('g', 'Y', 'T', 'V', 'R', 'M')
+
+    def __init__(self, pk):
+        """ Build pre-computation tables for public key `pk`
+
+        :param pk: public key
+        """
+        super().__init__(pk)
+        self.g = fixed_base(pk['g'])
+        self.Y = fixed_base(pk['Y'])
+        for key in ['T', 'V', 'R', 'M']:
+            setattr(self, key, {i: fixed_base(elem) for i, elem in pk[key].items()})
 
 
 def gen_token(sk, I_star):
     """ Create search token for a given query I_star.
     Elements of I_star is 0, 1, or a `WILDCARD`.
 
-    :param sk: secret key
+    The exponents `a[i] / t[i]`, `a[i] / v[i]` (bit 1) or `a[i] / r[i]`, `a[i] / m[i]` (bit 0)
+    are computed as products with inverses, which are either cached by a `PreparedSecretKey`
+    or computed for the token with a single batch inversion.
+
+    :param sk: secret key or prepared secret key
     :param I_star: query
     :returns: search token
     """
@@ -129,8 +188,6 @@ def gen_token(sk, I_star):
         K_y = g ** y
     else:
         # gen a_i
-        Y = dict()
-        L = dict()
         a = dict()
         count = 0
         sum_a = 0
@@ -145,29 +202,87 @@ def gen_token(sk, I_star):
                     sum_a += a[i]
                     count += 1
 
-        t = sk['t']
-        v = sk['v']
-        r = sk['r']
-        m = sk['m']
-        Y = dict()
-        L = dict()
-        for i in range(len(I_star)):
-            if I_star[i] == 1:
-                Y[i] = g ** (a[i] / t[i])
-                L[i] = g ** (a[i] / v[i])
-            elif I_star[i] == 0:
-                Y[i] = g ** (a[i] / r[i])
-                L[i] = g ** (a[i] / m[i])
-            else:
-                Y[i] = None
-                L[i] = None
+        # denominators of Y[i] and L[i] for bit 1 and bit 0
+        keys = {1: ('t', 'v'), 0: ('r', 'm')}
+        fixed = [i for i in range(len(I_star)) if I_star[i] == 0 or I_star[i] == 1]
+        if isinstance(sk, PreparedSecretKey):
+            inverses = [sk.inverse[key][i] for i in fixed for key in keys[I_star[i]]]
+        else:
+            inverses = batch_invert([sk[key][i] for i in fixed for key in keys[I_star[i]]])
+
+        Y = [None] * len(I_star)
+        L = [None] * len(I_star)
+        for k, i in enumerate(fixed):
+            Y[i] = g ** (a[i] * inverses[2 * k])
+            L[i] = g ** (a[i] * inverses[2 * k + 1])
+
+        K_y = (tuple(Y), tuple(L))
+
+    return Token(group, I_star=I_star, K_y=K_y)
+
 
-        K_y = (Y, L)
+def gen_tokens(sk, I_stars: list, max_workers: int = 0) -> list:
+    """ Create search tokens for many queries with a `PreparedSecretKey`, see `tokenset.gen_tokens`
 
-    token = {'I_star': I_star,
-             'K_y': K_y}
+    :param sk: secret key or prepared secret key
+    :param list I_stars: list of queries
+    :param int max_workers: number of worker processes to spread token generation over,
+        or 0 to generate tokens in this process
+    :returns: list of search tokens
+    """
+    return tokenset.gen_tokens(PreparedSecretKey, gen_token, sk, I_stars, max_workers)
+
+
+class PreparedSecretKey(Prepared):
+    """ Secret key with a fixed-base table for `g` and the inverses of `t[i]`, `v[i]`, `r[i]` and `m[i]`
+    of every position i, computed with a single batch inversion.
+    """
+    _prepared_keys = ('g',)
+
+    def __init__(self, sk):
+        """ Build the pre-computation table and the inverses for secret key `sk`
+
+        :param sk: secret key
+        """
+        super().__init__(sk)
+        self.g = fixed_base(sk['g'])
+
+        keys = ['t', 'v', 'r', 'm']
+        width = len(sk['t'])
+        inverses = batch_invert([sk[key][i] for key in keys for i in range(width)])
+        self.inverse = {}
+        for k, key in enumerate(keys):
+            self.inverse[key] = {i: inverses[k * width + i] for i in range(width)}
+
+
+def batch_invert(elements: list) -> list:
+    """ Invert elements of ZR with a single inversion (Montgomery's trick)
+
+    :param list elements: list of non-zero elements of ZR
+    :returns: list of the inverses
+    """
+    if not elements:
+        return []
+
+    prefix = [elements[0]]
+    for element in elements[1:]:
+        prefix.append(prefix[-1] * element)
 
-    return token
+    inverse = prefix[-1] ** -1
+    inverses = [None] * len(elements)
+    for k in range(len(elements) - 1, 0, -1):
+        inverses[k] = inverse * prefix[k - 1]
+        inverse = inverse * elements[k]
+    inverses[0] = inverse
+    return inverses
+
+
+class Token(GroupRecord):
+    """ Search token of HVE. `K_y` is an element if the query has no fixed position,
+    otherwise a pair of tuples `(Y, L)` indexed by position, with `None` at wildcard positions
+    """
+    __slots__ = ('I_star', 'K_y')
+    _fields = __slots__
 
 
 def query(token, cipher, predicate_only=False, group=None):
@@ -175,13 +290,130 @@ def query(token, cipher, predicate_only=False, group=None):
     If evaluating predicate only
     (i.e. only check if `token` holds for ciphertext `cipher`
     and do not care about message in the cipher text),
-    the group should be passed because the output of decryption will be compared
-    to the identity element of GT in the group
+    the output of decryption will be compared to the identity element of GT in the group.
+
+    All pairings `pair(X[i], Y[i]) * pair(W[i], L[i])` of the fixed positions i
+    (or `pair(C_0, K_y)` if there is no fixed position) are evaluated as a single multi-pairing
+    so that only one final exponentiation is needed for the whole token.
+
+    :param token: search token or prepared token
+    :param cipher: cipher text
+    :param bool predicate_only: whether or not only evaluates predicate
+    :param PairingGroup group: the pairing group, the group of the token is used if not provided
+    :returns: if predicateOnly, return whether the predicate represented by `token`
+              holds for cipher text `cipher`;
+              otherwise, return the decrypted message
+              (which is the orginal message if the decryption succeeded
+              or just a random element in GT)
+    """
+    if group is None:
+        group = token['group']
+
+    message_prime = cipher['omega'] * _pair_prod(token, cipher, group)
+
+    if predicate_only:
+        return is_unit_element(group, message_prime, GT)
+
+    return message_prime
+
+
+def match(token, cipher) -> bool:
+    """ Evaluates only whether the predicate represented by `token` holds for ciphertext `cipher`,
+    i.e. `query(token, cipher, predicate_only=True)` without the group argument.
+
+    :param token: search token
+    :param cipher: cipher text
+    :returns: whether the predicate represented by `token` holds for cipher text `cipher`
+    """
+    return query(token, cipher, predicate_only=True, group=token['group'])
+
+
+def match_any(tokens: list, cipher) -> bool:
+    """ Evaluates whether the predicate of any of the tokens holds for ciphertext `cipher`, see `tokenset.match_any`
+
+    :param list tokens: list of search tokens
+    :param cipher: cipher text
+    :returns: whether the predicate of any of the tokens holds
+    """
+    return tokenset.match_any(match, tokens, cipher)
+
+
+def match_any_scan(tokens: list, ciphertexts: list) -> list:
+    """ Find the cipher texts for which the predicate of any of the tokens holds, see `tokenset.match_any_scan`
+
+    :param list tokens: list of search tokens or prepared tokens
+    :param list ciphertexts: list of cipher texts
+    :returns: sorted list of indices of matched cipher texts
+    """
+    return tokenset.match_any_scan(match, tokens, ciphertexts, prepare_token)
+
+
+def _pair_prod(token, cipher, group):
+    """ Multi-pairing of `pair(X[i], Y[i]) * pair(W[i], L[i])` for every fixed position i of the token,
+    or `pair(C_0, K_y)` if the token has no fixed position
+    """
+    token = PreparedToken.prepare(token)
+
+    if not token.indices:
+        return group.pair_prod([cipher['C_0']], token.rhs)
+
+    X = cipher['X']
+    W = cipher['W']
+    lhs = []
+    for i in token.indices:
+        lhs.append(X[i])
+        lhs.append(W[i])
+    return group.pair_prod(lhs, token.rhs)
+
+
+def prepare_token(token):
+    """ Prepare a token to be evaluated against many cipher texts, see `PreparedToken`
+
+    :param token: search token or prepared token
+    :returns: prepared token
+    """
+    return PreparedToken.prepare(token)
+
+
+class PreparedToken(Prepared):
+    """ Search token with its fixed positions and the token side of the multi-pairing of `query`:
+    `Y[i]` and `L[i]` of every fixed position i, or `K_y` if there is no fixed position.
+    """
+
+    def __init__(self, token):
+        """ Prepare search token `token`
+
+        :param token: search token
+        """
+        super().__init__(token)
+        I_star = token['I_star']
+        self.indices = tuple(i for i in range(len(I_star)) if I_star[i] == 0 or I_star[i] == 1)
+
+        K_y = token['K_y']
+        if not self.indices:
+            self.rhs = [K_y]
+        else:
+            (Y, L) = K_y
+            self.rhs = []
+            for i in self.indices:
+                self.rhs.append(Y[i])
+                self.rhs.append(L[i])
+
+
+def query_reference(token, cipher, predicate_only=False, group=None):
+    """ Reference implementation of `query` which evaluates every pairing separately.
+    It is kept to cross-check `query`.
+
+    Evaluates if the predicate represented by `token` holds for ciphertext `cipher`.
+    If evaluating predicate only
+    (i.e. only check if `token` holds for ciphertext `cipher`
+    and do not care about message in the cipher text),
+    the output of decryption will be compared to the identity element of GT in the group.
 
     :param token: search token
     :param cipher: cipher text
     :param bool predicate_only: whether or not only evaluates predicate
-    :param PairingGroup group: the pairing group, only needed if predicateOnly
+    :param PairingGroup group: the pairing group, the group of the token is used if not provided
     :returns: if predicateOnly, return whether the predicate represented by `token`
               holds for cipher text `cipher`;
               otherwise, return the decrypted message
@@ -212,9 +444,8 @@ def query(token, cipher, predicate_only=False, group=None):
         message_prime = tmp
 
     if predicate_only:
-        assert group is not None, "Error: group must be provided when evaluate predicate only"
-        return get_unit_element(group, GT) == message_prime
+        if group is None:
+            group = token['group']
+        return is_unit_element(group, message_prime, GT)
 
     return message_prime
-
-
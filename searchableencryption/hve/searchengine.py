@@ -0,0 +1,215 @@
+""" Search engine which evaluates many tokens against many cipher texts
+with a pool of worker processes.
+
+The cipher texts are split into chunks which are evaluated by the workers.
+`iter_search` streams the matches of any iterable of cipher texts (e.g. a `CiphertextStore`)
+with a bounded number of chunks in flight.
+Chunks of a `CiphertextStore` are sent as their serialized records, which are deserialized only by the workers.
+The tokens are sent once to each worker when it starts, and only cipher texts are sent with the chunks.
+Tokens and cipher texts are pickled with their group and uncompressed elements (see `Uncompressed`),
+and each worker rebuilds its own pairing group once from the parameters of the group.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from searchableencryption.hve import serialization
+from searchableencryption.hve.tokenset import iter_matches
+from searchableencryption.toolbox.pairinggroup import PairingGroup, Uncompressed
+
+
+class SearchEngine(object):
+    """ Evaluates tokens against cipher texts with a `ProcessPoolExecutor`.
+
+    The engine works with any query function which has the signature of `hve.query`
+    (e.g. `hve.query` or `hveprime.query`) and is defined at module level.
+
+    The workers hold the tokens of the last search, so searching other tokens starts a new pool of workers
+    and ends the previous one, including the pool of an unfinished `iter_search`.
+    """
+
+    def __init__(self, query, group: PairingGroup, max_workers: int = None, chunk_size: int = 256,
+                 prepare_token=None):
+        """
+        :param query: query function, e.g. `hve.query`
+        :param PairingGroup group: the pairing group of tokens and cipher texts
+        :param int max_workers: number of worker processes, or 0 to evaluate in this process.
+            The default is the number of processors of the machine
+        :param int chunk_size: number of cipher texts sent to a worker at a time
+        :param prepare_token: optional function to prepare a token once before the scan,
+            e.g. `hve.prepare_token`
+        """
+        assert chunk_size > 0, "Error: chunk size must be positive"
+
+        self.query = query
+        self.prepare_token = prepare_token
+        self.group = group
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self._executor = None
+        self._tokens = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """ Shut down the worker processes if any
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+            self._tokens = None
+
+    def _get_executor(self, tokens: list) -> ProcessPoolExecutor:
+        """ Pool of workers which hold `tokens`, started unless the current pool holds the same tokens
+        """
+        if self._executor is None or len(self._tokens) != len(tokens) or \
+                any(token is not worker_token for token, worker_token in zip(tokens, self._tokens)):
+            self.close()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 initializer=_init_search_worker,
+                                                 initargs=(self.query, Uncompressed(list(tokens)), self.group,
+                                                           self.prepare_token))
+            self._tokens = list(tokens)
+        return self._executor
+
+    def _match(self, token, cipher) -> bool:
+        return self.query(token, cipher, predicate_only=True, group=self.group)
+
+    def _prepare_tokens(self, tokens: list) -> list:
+        if self.prepare_token is None:
+            return tokens
+        return [self.prepare_token(token) for token in tokens]
+
+    def _worker_chunks(self, ciphertexts):
+        """ Chunks of cipher texts as sent to the workers
+
+        :param ciphertexts: iterable of cipher texts
+        :returns: generator of (index of the first cipher text of the chunk,
+            serialized records of a `CiphertextStore` or list of cipher texts)
+        """
+        if hasattr(ciphertexts, 'read_records'):  # a `CiphertextStore`
+            for start in range(0, len(ciphertexts), self.chunk_size):
+                yield (start, ciphertexts.read_records(start, start + self.chunk_size))
+            return
+
+        iterator = iter(ciphertexts)
+        start = 0
+        while True:
+            chunk = list(islice(iterator, self.chunk_size))
+            if not chunk:
+                return
+            yield (start, Uncompressed(chunk))
+            start += len(chunk)
+
+    def search(self, tokens: list, ciphertexts: list) -> list:
+        """ Evaluate every token against every cipher text
+
+        :param list tokens: list of search tokens
+        :param list ciphertexts: iterable of cipher texts or a `CiphertextStore`
+        :returns: list of list of matched cipher text indices of each token
+        """
+        matches = [[] for _ in tokens]
+        if not tokens:
+            return matches
+
+        if self.max_workers == 0:
+            chunk_matches = [_scan_chunk(self.query, self._prepare_tokens(tokens), 0, ciphertexts, self.group)]
+        else:
+            chunks = list(self._worker_chunks(ciphertexts))
+            if not chunks:
+                return matches
+            chunk_matches = self._get_executor(tokens).map(_search_chunk, *zip(*chunks))
+
+        for chunk_match in chunk_matches:
+            for ti, matched_items in enumerate(chunk_match):
+                matches[ti].extend(matched_items)
+
+        return matches
+
+    def iter_search(self, tokens: list, ciphertexts, max_pending: int = None):
+        """ Evaluate every token against every cipher text and yield the matches as they are found.
+        The cipher texts are read from the iterable one chunk at a time,
+        so at most `max_pending` chunks are held in memory, and the consumer can stop at any time.
+
+        Without worker processes, matches are yielded right after their cipher text is evaluated.
+        With worker processes, matches are yielded chunk by chunk, in the order of the cipher texts.
+
+        :param list tokens: list of search tokens
+        :param ciphertexts: iterable of cipher texts or a `CiphertextStore`
+        :param int max_pending: number of chunks sent to the workers but not yet consumed,
+            default is twice the number of workers
+        :returns: generator of (cipher text index, token index) pairs
+        """
+        if not tokens:
+            return
+
+        if self.max_workers == 0:
+            for pair in iter_matches(self._match, self._prepare_tokens(tokens), ciphertexts):
+                yield pair
+            return
+
+        executor = self._get_executor(tokens)
+        if max_pending is None:
+            max_pending = 2 * (self.max_workers or os.cpu_count() or 1)
+        assert max_pending > 0, "Error: number of pending chunks must be positive"
+
+        chunks = self._worker_chunks(ciphertexts)
+        pending = deque()
+        try:
+            while True:
+                for start, chunk in islice(chunks, max_pending - len(pending)):
+                    pending.append(executor.submit(_search_chunk, start, chunk))
+                if not pending:
+                    return
+
+                chunk_match = pending.popleft().result()
+                for pair in sorted((ci, ti) for ti, matched_items in enumerate(chunk_match)
+                                   for ci in matched_items):
+                    yield pair
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+_worker_search = None
+
+
+def _init_search_worker(query, tokens: list, group: PairingGroup, prepare_token=None):
+    """ Keep the query function, the prepared tokens and the group in the worker
+    """
+    global _worker_search
+    if prepare_token is not None:
+        tokens = [prepare_token(token) for token in tokens]
+    _worker_search = (query, tokens, group)
+
+
+def _search_chunk(start: int, ciphertexts) -> list:
+    """ Evaluate the tokens of the worker against a chunk of cipher texts,
+    given as a list or as serialized records of a `CiphertextStore`
+    """
+    (query, tokens, group) = _worker_search
+    if isinstance(ciphertexts, bytes):
+        ciphertexts = serialization.decode_ciphertexts(ciphertexts, group)
+    return _scan_chunk(query, tokens, start, ciphertexts, group)
+
+
+def _scan_chunk(query, tokens: list, start: int, ciphertexts: list, group: PairingGroup) -> list:
+    """ Evaluate every token against a chunk of cipher texts
+
+    :param query: query function
+    :param list tokens: list of (prepared) search tokens
+    :param int start: index of the first cipher text of the chunk
+    :param list ciphertexts: chunk of cipher texts
+    :param PairingGroup group: the pairing group
+    :returns: list of list of matched cipher text indices of each token
+    """
+    matches = [[] for _ in tokens]
+    for ci, ti in iter_matches(lambda token, cipher: query(token, cipher, predicate_only=True, group=group),
+                               tokens, ciphertexts):
+        matches[ti].append(start + ci)
+    return matches
@@ -0,0 +1,459 @@
+""" Compact binary serialization of keys, cipher texts and tokens of `hve` and `hveprime`.
+
+Every serialized object starts with a header of `HEADER_SIZE` bytes:
+magic (4 bytes), format version (1 byte), scheme (1 byte), kind of object (1 byte),
+flags (1 byte) and width (4 bytes), all big-endian.
+
+Group elements are stored as the binary representation from `PairingGroup.serialize`,
+without its type prefix and base64 encoding,
+either in compressed form (`FLAG_COMPRESSED`) or not.
+Compressed points take about half the space but need a square root to be decompressed.
+Elements of a type have a fixed length in a group,
+so all cipher texts of one scheme and width have the same size (see `ciphertext_size`).
+
+The group itself is not serialized, it has to be passed when decoding.
+"""
+import base64
+import struct
+from functools import lru_cache
+
+from searchableencryption.hve import hve, hveprime
+from searchableencryption.hve.util import WILDCARD
+from searchableencryption.toolbox.pairinggroup import PairingGroup, GroupDict, ZR, G1, G2, GT
+
+MAGIC = b'SEHV'
+VERSION = 1
+
+SCHEME_HVE = 1
+SCHEME_HVE_PRIME = 2
+
+KIND_PUBLIC_KEY = 1
+KIND_SECRET_KEY = 2
+KIND_CIPHERTEXT = 3
+KIND_CIPHERTEXTS = 4
+KIND_TOKEN = 5
+
+FLAG_COMPRESSED = 0x01
+FLAG_SPARSE = 0x02
+
+_HEADER = struct.Struct('>4sBBBBI')
+HEADER_SIZE = _HEADER.size
+
+_QUERY_WILDCARD = 2
+
+
+def encode_header(scheme: int, kind: int, flags: int, width: int) -> bytes:
+    """ Encode the header of a serialized object
+
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param int kind: kind of object, e.g. `KIND_CIPHERTEXT`
+    :param int flags: combination of `FLAG_COMPRESSED` and `FLAG_SPARSE`
+    :param int width: the length of attribute vector
+    :returns: the header
+    """
+    return _HEADER.pack(MAGIC, VERSION, scheme, kind, flags, width)
+
+
+def decode_header(data: bytes, kind: int = None) -> tuple:
+    """ Decode the header of a serialized object
+
+    :param bytes data: serialized object
+    :param int kind: expected kind of object, if any
+    :returns: (scheme, kind, flags, width)
+    """
+    assert len(data) >= HEADER_SIZE, "Error: data is too short"
+    (magic, version, scheme, data_kind, flags, width) = _HEADER.unpack_from(data)
+    assert magic == MAGIC, "Error: not a serialized HVE object"
+    assert version == VERSION, "Error: unsupported format version %d" % version
+    assert kind is None or kind == data_kind, "Error: unexpected kind of object %d" % data_kind
+    return (scheme, data_kind, flags, width)
+
+
+@lru_cache(maxsize=None)
+def element_size(group: PairingGroup, _type: int, compression: bool = True) -> int:
+    """ Size in bytes of a serialized element of type ZR, G1, G2 or GT
+
+    :param PairingGroup group: the pairing group
+    :param int _type: ZR, G1, G2 or GT
+    :param bool compression: whether or not the element is compressed
+    :returns: size in bytes
+    """
+    if _type == GT:
+        sample = group.unit_element(GT)
+    else:
+        sample = group.random(_type)
+    return group.element_length(sample, compression=compression)
+
+
+def ciphertext_size(group: PairingGroup, scheme: int, width: int, compression: bool = True) -> int:
+    """ Size in bytes of a cipher text record, i.e. a serialized cipher text without header
+
+    :param PairingGroup group: the pairing group
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param int width: the length of attribute vector
+    :param bool compression: whether or not elements are compressed
+    :returns: size in bytes
+    """
+    # both schemes have 1 element in GT and 1 + 2 * width elements in G1
+    return element_size(group, GT, compression) + (1 + 2 * width) * element_size(group, G1, compression)
+
+
+class _Writer(object):
+    """ Writes elements, integers and bytes to a buffer
+    """
+
+    def __init__(self, group: PairingGroup, compression: bool):
+        self.group = group
+        self.compression = compression
+        self.parts = []
+
+    def element(self, elem):
+        data = self.group.serialize(elem, compression=self.compression)
+        self.parts.append(base64.b64decode(data.split(b':', 1)[1]))
+
+    def elements(self, elems: dict, positions):
+        for i in positions:
+            self.element(elems[i])
+
+    def integer(self, value: int):
+        value = int(value)
+        data = value.to_bytes(max(1, (value.bit_length() + 7) // 8), 'big')
+        self.parts.append(struct.pack('>H', len(data)))
+        self.parts.append(data)
+
+    def query(self, I_star: list):
+        self.parts.append(bytes([val if val == 0 or val == 1 else _QUERY_WILDCARD for val in I_star]))
+
+    def getvalue(self) -> bytes:
+        return b''.join(self.parts)
+
+
+class _Reader(object):
+    """ Reads elements, integers and bytes written by `_Writer`
+    """
+
+    def __init__(self, group: PairingGroup, data: bytes, offset: int, compression: bool):
+        self.group = group
+        self.data = data
+        self.offset = offset
+        self.compression = compression
+
+    def _take(self, size: int) -> bytes:
+        assert self.offset + size <= len(self.data), "Error: data is too short"
+        value = self.data[self.offset:self.offset + size]
+        self.offset += size
+        return value
+
+    def element(self, _type: int):
+        raw = self._take(element_size(self.group, _type, self.compression))
+        data = b'%d:' % _type + base64.b64encode(raw)
+        return self.group.deserialize(data, compression=self.compression)
+
+    def elements(self, _type: int, positions) -> dict:
+        return {i: self.element(_type) for i in positions}
+
+    def element_tuple(self, _type: int, width: int) -> tuple:
+        return tuple(self.element(_type) for _ in range(width))
+
+    def integer(self) -> int:
+        (size,) = struct.unpack('>H', self._take(2))
+        return int.from_bytes(self._take(size), 'big')
+
+    def query(self, width: int) -> list:
+        return [val if val != _QUERY_WILDCARD else WILDCARD for val in self._take(width)]
+
+
+def _token_type(group: PairingGroup) -> int:
+    """ Type of the elements of `hveprime` tokens, which are in G2 with an asymmetric pairing
+    """
+    return G1 if group.is_symmetric() else G2
+
+
+def _flags(compression: bool, sparse: bool = False) -> int:
+    return (FLAG_COMPRESSED if compression else 0) | (FLAG_SPARSE if sparse else 0)
+
+
+def _write_ciphertext(writer: _Writer, cipher, scheme: int, width: int):
+    if scheme == SCHEME_HVE:
+        writer.element(cipher['C_prime'])
+        writer.element(cipher['C_0'])
+        writer.elements(cipher['C_1'], range(width))
+        writer.elements(cipher['C_2'], range(width))
+    else:
+        writer.element(cipher['omega'])
+        writer.element(cipher['C_0'])
+        writer.elements(cipher['X'], range(width))
+        writer.elements(cipher['W'], range(width))
+
+
+def _read_ciphertext(reader: _Reader, scheme: int, width: int):
+    if scheme == SCHEME_HVE:
+        return hve.Ciphertext(reader.group,
+                              C_prime=reader.element(GT),
+                              C_0=reader.element(G1),
+                              C_1=reader.element_tuple(G1, width),
+                              C_2=reader.element_tuple(G1, width))
+    return hveprime.Ciphertext(reader.group,
+                               omega=reader.element(GT),
+                               C_0=reader.element(G1),
+                               X=reader.element_tuple(G1, width),
+                               W=reader.element_tuple(G1, width))
+
+
+def _ciphertext_width(cipher, scheme: int) -> int:
+    return len(cipher['C_1'] if scheme == SCHEME_HVE else cipher['X'])
+
+
+def encode_ciphertext_record(cipher, group: PairingGroup, scheme: int = SCHEME_HVE,
+                             compression: bool = True) -> bytes:
+    """ Serialize a cipher text without header. The record has `ciphertext_size` bytes
+
+    :param cipher: cipher text
+    :param PairingGroup group: the pairing group
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param bool compression: whether or not to compress elements
+    :returns: the record
+    """
+    writer = _Writer(group, compression)
+    _write_ciphertext(writer, cipher, scheme, _ciphertext_width(cipher, scheme))
+    return writer.getvalue()
+
+
+def decode_ciphertext_record(data: bytes, group: PairingGroup, scheme: int, width: int,
+                             compression: bool = True, offset: int = 0):
+    """ Deserialize a cipher text record written by `encode_ciphertext_record`
+
+    :param bytes data: buffer which contains the record
+    :param PairingGroup group: the pairing group
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param int width: the length of attribute vector
+    :param bool compression: whether or not elements are compressed
+    :param int offset: offset of the record in the buffer
+    :returns: cipher text
+    """
+    return _read_ciphertext(_Reader(group, data, offset, compression), scheme, width)
+
+
+def encode_ciphertext(cipher, group: PairingGroup, scheme: int = SCHEME_HVE, compression: bool = True) -> bytes:
+    """ Serialize a cipher text
+
+    :param cipher: cipher text
+    :param PairingGroup group: the pairing group
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param bool compression: whether or not to compress elements
+    :returns: serialized cipher text
+    """
+    width = _ciphertext_width(cipher, scheme)
+    return encode_header(scheme, KIND_CIPHERTEXT, _flags(compression), width) + \
+        encode_ciphertext_record(cipher, group, scheme, compression)
+
+
+def decode_ciphertext(data: bytes, group: PairingGroup):
+    """ Deserialize a cipher text written by `encode_ciphertext`
+
+    :param bytes data: serialized cipher text
+    :param PairingGroup group: the pairing group
+    :returns: cipher text
+    """
+    (scheme, _, flags, width) = decode_header(data, KIND_CIPHERTEXT)
+    return decode_ciphertext_record(data, group, scheme, width, bool(flags & FLAG_COMPRESSED), HEADER_SIZE)
+
+
+def encode_ciphertexts(ciphertexts: list, group: PairingGroup, scheme: int = SCHEME_HVE,
+                       compression: bool = True) -> bytes:
+    """ Serialize a list of cipher texts of the same width as one header followed by fixed-size records
+
+    :param list ciphertexts: list of cipher texts
+    :param PairingGroup group: the pairing group
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param bool compression: whether or not to compress elements
+    :returns: serialized cipher texts
+    """
+    width = _ciphertext_width(ciphertexts[0], scheme) if ciphertexts else 0
+    writer = _Writer(group, compression)
+    for cipher in ciphertexts:
+        assert _ciphertext_width(cipher, scheme) == width, "Error: cipher texts are not the same width"
+        _write_ciphertext(writer, cipher, scheme, width)
+    return encode_header(scheme, KIND_CIPHERTEXTS, _flags(compression), width) + writer.getvalue()
+
+
+def decode_ciphertexts(data: bytes, group: PairingGroup) -> list:
+    """ Deserialize a list of cipher texts written by `encode_ciphertexts`
+
+    :param bytes data: serialized cipher texts
+    :param PairingGroup group: the pairing group
+    :returns: list of cipher texts
+    """
+    (scheme, _, flags, width) = decode_header(data, KIND_CIPHERTEXTS)
+    compression = bool(flags & FLAG_COMPRESSED)
+    size = ciphertext_size(group, scheme, width, compression)
+    assert (len(data) - HEADER_SIZE) % size == 0, "Error: data is not a whole number of cipher texts"
+
+    reader = _Reader(group, data, HEADER_SIZE, compression)
+    return [_read_ciphertext(reader, scheme, width) for _ in range((len(data) - HEADER_SIZE) // size)]
+
+
+def encode_token(token, group: PairingGroup, scheme: int = SCHEME_HVE, compression: bool = True) -> bytes:
+    """ Serialize a search token, either sparse or not
+
+    :param token: search token
+    :param PairingGroup group: the pairing group
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param bool compression: whether or not to compress elements
+    :returns: serialized token
+    """
+    I_star = token['I_star']
+    width = len(I_star)
+    fixed = [i for i in range(width) if I_star[i] == 0 or I_star[i] == 1]
+    writer = _Writer(group, compression)
+    writer.query(I_star)
+
+    if scheme == SCHEME_HVE:
+        sparse = 'indices' in token
+        writer.element(token['K_0'])
+        positions = fixed if sparse else range(width)
+        writer.elements(token['K_1'], positions)
+        writer.elements(token['K_2'], positions)
+    else:
+        # tokens of hveprime only have elements for the fixed positions
+        sparse = True
+        K_y = token['K_y']
+        if not fixed:
+            writer.element(K_y)
+        else:
+            writer.elements(K_y[0], fixed)
+            writer.elements(K_y[1], fixed)
+
+    return encode_header(scheme, KIND_TOKEN, _flags(compression, sparse), width) + writer.getvalue()
+
+
+def decode_token(data: bytes, group: PairingGroup):
+    """ Deserialize a search token written by `encode_token`
+
+    :param bytes data: serialized token
+    :param PairingGroup group: the pairing group
+    :returns: search token
+    """
+    (scheme, _, flags, width) = decode_header(data, KIND_TOKEN)
+    reader = _Reader(group, data, HEADER_SIZE, bool(flags & FLAG_COMPRESSED))
+    I_star = reader.query(width)
+    fixed = [i for i in range(width) if I_star[i] == 0 or I_star[i] == 1]
+
+    if scheme == SCHEME_HVE:
+        K_0 = reader.element(G1)
+        if flags & FLAG_SPARSE:
+            return hve.Token(group, I_star=I_star, K_0=K_0,
+                             K_1=reader.elements(G1, fixed), K_2=reader.elements(G1, fixed), indices=fixed)
+        return hve.Token(group, I_star=I_star, K_0=K_0,
+                         K_1=reader.element_tuple(G1, width), K_2=reader.element_tuple(G1, width))
+
+    token_type = _token_type(group)
+    if not fixed:
+        K_y = reader.element(token_type)
+    else:
+        Y = reader.elements(token_type, fixed)
+        L = reader.elements(token_type, fixed)
+        K_y = (tuple(Y.get(i) for i in range(width)), tuple(L.get(i) for i in range(width)))
+    return hveprime.Token(group, I_star=I_star, K_y=K_y)
+
+
+def encode_public_key(pk, scheme: int = SCHEME_HVE, compression: bool = True) -> bytes:
+    """ Serialize a public key
+
+    :param pk: public key
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param bool compression: whether or not to compress elements
+    :returns: serialized public key
+    """
+    writer = _Writer(pk['group'], compression)
+    if scheme == SCHEME_HVE:
+        width = len(pk['U'])
+        writer.element(pk['g_q'])
+        writer.element(pk['V'])
+        writer.element(pk['A'])
+        for key in ['U', 'H', 'W']:
+            writer.elements(pk[key], range(width))
+    else:
+        width = len(pk['T'])
+        writer.element(pk['g'])
+        writer.element(pk['Y'])
+        for key in ['T', 'V', 'R', 'M']:
+            writer.elements(pk[key], range(width))
+    return encode_header(scheme, KIND_PUBLIC_KEY, _flags(compression), width) + writer.getvalue()
+
+
+def decode_public_key(data: bytes, group: PairingGroup) -> GroupDict:
+    """ Deserialize a public key written by `encode_public_key`
+
+    :param bytes data: serialized public key
+    :param PairingGroup group: the pairing group
+    :returns: public key
+    """
+    (scheme, _, flags, width) = decode_header(data, KIND_PUBLIC_KEY)
+    reader = _Reader(group, data, HEADER_SIZE, bool(flags & FLAG_COMPRESSED))
+    pk = GroupDict(group, {'group': group})
+    if scheme == SCHEME_HVE:
+        pk['g_q'] = reader.element(G1)
+        pk['V'] = reader.element(G1)
+        pk['A'] = reader.element(GT)
+        for key in ['U', 'H', 'W']:
+            pk[key] = reader.elements(G1, range(width))
+    else:
+        pk['g'] = reader.element(G1)
+        pk['Y'] = reader.element(GT)
+        for key in ['T', 'V', 'R', 'M']:
+            pk[key] = reader.elements(G1, range(width))
+    return pk
+
+
+def encode_secret_key(sk, scheme: int = SCHEME_HVE, compression: bool = True) -> bytes:
+    """ Serialize a secret key
+
+    :param sk: secret key
+    :param int scheme: `SCHEME_HVE` or `SCHEME_HVE_PRIME`
+    :param bool compression: whether or not to compress elements
+    :returns: serialized secret key
+    """
+    writer = _Writer(sk['group'], compression)
+    if scheme == SCHEME_HVE:
+        width = len(sk['u'])
+        writer.element(sk['g_q'])
+        writer.element(sk['g'])
+        writer.element(sk['v'])
+        for key in ['a', 'p', 'q']:
+            writer.integer(sk[key])
+        for key in ['u', 'h', 'w']:
+            writer.elements(sk[key], range(width))
+    else:
+        width = len(sk['t'])
+        writer.element(sk['g'])
+        writer.element(sk['y'])
+        for key in ['t', 'v', 'r', 'm']:
+            writer.elements(sk[key], range(width))
+    return encode_header(scheme, KIND_SECRET_KEY, _flags(compression), width) + writer.getvalue()
+
+
+def decode_secret_key(data: bytes, group: PairingGroup) -> GroupDict:
+    """ Deserialize a secret key written by `encode_secret_key`
+
+    :param bytes data: serialized secret key
+    :param PairingGroup group: the pairing group
+    :returns: secret key
+    """
+    (scheme, _, flags, width) = decode_header(data, KIND_SECRET_KEY)
+    reader = _Reader(group, data, HEADER_SIZE, bool(flags & FLAG_COMPRESSED))
+    sk = GroupDict(group, {'group': group})
+    if scheme == SCHEME_HVE:
+        sk['g_q'] = reader.element(G1)
+        sk['g'] = reader.element(G1)
+        sk['v'] = reader.element(G1)
+        for key in ['a', 'p', 'q']:
+            sk[key] = reader.integer()
+        for key in ['u', 'h', 'w']:
+            sk[key] = reader.elements(G1, range(width))
+    else:
+        sk['g'] = reader.element(_token_type(group))
+        sk['y'] = reader.element(ZR)
+        for key in ['t', 'v', 'r', 'm']:
+            sk[key] = reader.elements(ZR, range(width))
+    return sk
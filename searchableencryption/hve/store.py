@@ -0,0 +1,182 @@
+""" Store of cipher texts of `hve` or `hveprime` in a file.
+
+The file contains a header followed by fixed-size cipher text records (see `serialization`),
+so the i-th cipher text is read directly from a memory map of the file without loading the others.
+Scans deserialize one chunk of cipher texts at a time,
+so the memory use does not depend on the number of cipher texts in the store.
+"""
+import mmap
+import os
+
+from searchableencryption.hve.tokenset import iter_matches
+from searchableencryption.hve.serialization import SCHEME_HVE, KIND_CIPHERTEXTS, FLAG_COMPRESSED, HEADER_SIZE, \
+    encode_header, decode_header, ciphertext_size, encode_ciphertext_record, decode_ciphertext_record
+from searchableencryption.toolbox.pairinggroup import PairingGroup
+
+
+class CiphertextStore(object):
+    """ Cipher texts of the same scheme and width in a file, with an append API and random access.
+
+    A store can be used as a sequence of cipher texts, e.g. `store[i]`, `store[i:j]`, `len(store)`
+    or `for cipher in store`, and so with the query and match functions of `hve` and `hveprime`.
+    """
+
+    def __init__(self, path: str, group: PairingGroup, scheme: int = None, width: int = None,
+                 compression: bool = True):
+        """ Open the store at `path`, or create it if the file does not exist.
+        The scheme, width and compression of an existing store are read from the file.
+
+        :param str path: path of the file
+        :param PairingGroup group: the pairing group of the cipher texts
+        :param int scheme: `SCHEME_HVE` (default for a new store) or `SCHEME_HVE_PRIME`
+        :param int width: the length of attribute vector.
+            If not provided for a new store, it is the width of the first appended cipher text
+        :param bool compression: whether or not to compress elements of a new store
+        """
+        self.path = path
+        self.group = group
+        self._file = open(path, 'a+b')
+        self._mmap = None
+
+        self._file.seek(0, os.SEEK_END)
+        file_size = self._file.tell()
+        if file_size > 0:
+            self._file.seek(0)
+            (file_scheme, _, flags, file_width) = decode_header(self._file.read(HEADER_SIZE), KIND_CIPHERTEXTS)
+            assert scheme is None or scheme == file_scheme, "Error: the store has another scheme"
+            assert width is None or width == file_width, "Error: the store has another width"
+            (scheme, width, compression) = (file_scheme, file_width, bool(flags & FLAG_COMPRESSED))
+
+        self.scheme = scheme if scheme is not None else SCHEME_HVE
+        self.width = width
+        self.compression = compression
+        self.record_size = None
+        self._count = 0
+
+        if width is not None:
+            self.record_size = ciphertext_size(group, self.scheme, width, compression)
+            if file_size > 0:
+                assert (file_size - HEADER_SIZE) % self.record_size == 0, "Error: the store is truncated"
+                self._count = (file_size - HEADER_SIZE) // self.record_size
+            else:
+                self._write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._read(i) for i in range(*index.indices(self._count))]
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError('cipher text index out of range')
+        return self._read(index)
+
+    def __iter__(self):
+        for _, chunk in self.iter_chunks():
+            for cipher in chunk:
+                yield cipher
+
+    def close(self):
+        """ Flush appended cipher texts and close the file
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def flush(self):
+        """ Write appended cipher texts to the file
+        """
+        self._file.flush()
+
+    def _write_header(self):
+        flags = FLAG_COMPRESSED if self.compression else 0
+        self._file.write(encode_header(self.scheme, KIND_CIPHERTEXTS, flags, self.width))
+
+    def append(self, cipher) -> int:
+        """ Append a cipher text to the store
+
+        :param cipher: cipher text
+        :returns: index of the cipher text in the store
+        """
+        record = encode_ciphertext_record(cipher, self.group, self.scheme, self.compression)
+        if self.width is None:
+            self.width = len(cipher['C_1'] if self.scheme == SCHEME_HVE else cipher['X'])
+            self.record_size = ciphertext_size(self.group, self.scheme, self.width, self.compression)
+            self._write_header()
+        assert len(record) == self.record_size, "Error: the cipher text has another width"
+
+        self._file.write(record)
+        self._count += 1
+        return self._count - 1
+
+    def extend(self, ciphertexts):
+        """ Append cipher texts to the store
+
+        :param ciphertexts: iterable of cipher texts
+        """
+        for cipher in ciphertexts:
+            self.append(cipher)
+
+    def _buffer(self) -> mmap.mmap:
+        """ Memory map of the file which contains all appended cipher texts
+        """
+        end = HEADER_SIZE + self._count * self.record_size
+        if self._mmap is None or len(self._mmap) < end:
+            self._file.flush()
+            if self._mmap is not None:
+                self._mmap.close()
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def read_records(self, start: int, stop: int) -> bytes:
+        """ Read cipher texts without deserializing them, e.g. to deserialize them in a worker process
+
+        :param int start: index of the first cipher text
+        :param int stop: index after the last cipher text
+        :returns: the cipher texts serialized as by `serialization.encode_ciphertexts`
+        """
+        stop = min(stop, self._count)
+        flags = FLAG_COMPRESSED if self.compression else 0
+        return encode_header(self.scheme, KIND_CIPHERTEXTS, flags, self.width) + \
+            self._buffer()[HEADER_SIZE + start * self.record_size:HEADER_SIZE + stop * self.record_size]
+
+    def _read(self, index: int):
+        return decode_ciphertext_record(self._buffer(), self.group, self.scheme, self.width, self.compression,
+                                        HEADER_SIZE + index * self.record_size)
+
+    def iter_chunks(self, chunk_size: int = 256, start: int = 0, stop: int = None):
+        """ Iterate over chunks of cipher texts, deserializing one chunk at a time
+
+        :param int chunk_size: number of cipher texts in a chunk
+        :param int start: index of the first cipher text
+        :param int stop: index after the last cipher text, default is the end of the store
+        :returns: generator of (index of the first cipher text of the chunk, list of cipher texts)
+        """
+        assert chunk_size > 0, "Error: chunk size must be positive"
+        stop = self._count if stop is None else min(stop, self._count)
+        for chunk_start in range(start, stop, chunk_size):
+            yield (chunk_start, [self._read(i) for i in range(chunk_start, min(chunk_start + chunk_size, stop))])
+
+    def search(self, match, tokens: list, chunk_size: int = 256) -> list:
+        """ Evaluate every token against every cipher text of the store, one chunk at a time,
+        see `tokenset.iter_matches`
+
+        :param match: match function, e.g. `hve.match` or `hveprime.match`
+        :param list tokens: list of search tokens
+        :param int chunk_size: number of cipher texts deserialized at a time
+        :returns: list of list of matched cipher text indices of each token
+        """
+        matches = [[] for _ in tokens]
+        ciphertexts = (cipher for _, chunk in self.iter_chunks(chunk_size) for cipher in chunk)
+        for ci, ti in iter_matches(match, tokens, ciphertexts):
+            matches[ti].append(ci)
+        return matches
@@ -0,0 +1,118 @@
+""" Evaluation and generation of sets of tokens, shared by `hve` and `hveprime`.
+
+The module imports neither scheme, which pass their own functions and classes to it.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+from searchableencryption.hve import util
+
+
+def iter_matches(match, tokens: list, ciphertexts):
+    """ Evaluate every token against every cipher text and yield the matches as they are found.
+    The cipher texts can be any iterable, e.g. a generator or a `CiphertextStore`,
+    and they are consumed one at a time.
+
+    :param match: predicate-only evaluation function with signature `match(token, cipher)`
+    :param list tokens: list of search tokens
+    :param ciphertexts: iterable of cipher texts
+    :returns: generator of (cipher text index, token index) pairs
+    """
+    for ci, cipher in enumerate(ciphertexts):
+        for ti, token in enumerate(tokens):
+            if match(token, cipher):
+                yield (ci, ti)
+
+
+def match_any(match, tokens: list, cipher) -> bool:
+    """ Evaluates whether the predicate of any of the tokens holds for a cipher text,
+    e.g. whether a location is inside a region given by the minimized queries of the region.
+    Tokens are evaluated from the cheapest one, i.e. the one with the fewest fixed positions,
+    and the evaluation stops at the first match.
+
+    :param match: predicate-only evaluation function with signature `match(token, cipher)`
+    :param list tokens: list of search tokens
+    :param cipher: cipher text
+    :returns: whether the predicate of any of the tokens holds
+    """
+    for token in sort_tokens_by_cost(tokens):
+        if match(token, cipher):
+            return True
+    return False
+
+
+def match_any_scan(match, tokens: list, ciphertexts: list, prepare_token=None) -> list:
+    """ Find the cipher texts for which the predicate of any of the tokens holds.
+    Tokens are evaluated from the cheapest one and a cipher text which already matched a token
+    is not evaluated against the remaining tokens.
+
+    :param match: predicate-only evaluation function with signature `match(token, cipher)`
+    :param list tokens: list of search tokens
+    :param list ciphertexts: list of cipher texts
+    :param prepare_token: optional function to prepare the tokens once before the scan,
+        e.g. `hve.prepare_token`
+    :returns: sorted list of indices of matched cipher texts
+    """
+    if prepare_token is not None:
+        tokens = [prepare_token(token) for token in tokens]
+    matched_items = []
+    remaining = list(range(len(ciphertexts)))
+    for token in sort_tokens_by_cost(tokens):
+        not_matched = []
+        for ci in remaining:
+            if match(token, ciphertexts[ci]):
+                matched_items.append(ci)
+            else:
+                not_matched.append(ci)
+        remaining = not_matched
+
+    return sorted(matched_items)
+
+
+def sort_tokens_by_cost(tokens: list) -> list:
+    """ Sort tokens by the number of fixed positions, which is the number of pairings they need
+
+    :param list tokens: list of search tokens
+    :returns: sorted list of tokens
+    """
+    return sorted(tokens, key=lambda token: util.num_fixed_positions(token['I_star']))
+
+
+def gen_tokens(prepare, gen_token, sk, I_stars: list, max_workers: int = 0, **kwargs) -> list:
+    """ Create search tokens for many queries with a secret key which is prepared once,
+    e.g. the minimized queries of a region.
+
+    :param prepare: class of prepared secret keys, e.g. `hve.PreparedSecretKey`
+    :param gen_token: token generation function, e.g. `hve.gen_token`
+    :param sk: secret key or prepared secret key
+    :param list I_stars: list of queries
+    :param int max_workers: number of worker processes to spread token generation over,
+        or 0 to generate tokens in this process.
+        Each worker prepares its own copy of the secret key
+    :param kwargs: other arguments of `gen_token`, e.g. `sparse`
+    :returns: list of search tokens
+    """
+    if max_workers == 0:
+        sk = prepare.prepare(sk)
+        return [gen_token(sk, I_star, **kwargs) for I_star in I_stars]
+
+    if isinstance(sk, prepare):
+        sk = sk.obj
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=_init_token_worker,
+                             initargs=(prepare, gen_token, sk, kwargs)) as executor:
+        return list(executor.map(_gen_token_worker, I_stars))
+
+
+_worker_token_generator = None
+
+
+def _init_token_worker(prepare, gen_token, sk, kwargs: dict):
+    """ Prepare the secret key in a worker process of `gen_tokens`
+    """
+    global _worker_token_generator
+    _worker_token_generator = (gen_token, prepare(sk), kwargs)
+
+
+def _gen_token_worker(I_star):
+    (gen_token, sk, kwargs) = _worker_token_generator
+    return gen_token(sk, I_star, **kwargs)
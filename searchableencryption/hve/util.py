@@ -24,6 +24,15 @@ def next_power_2(x: int) -> int:
     return 0 if x < 1 else shift_left_bit_length(x)
 
 
+def num_fixed_positions(I_star: list) -> int:
+    """ Number of fixed (non-wildcard) positions, i.e. 0 or 1, of a query
+
+    :param list I_star: query with 0, 1, or `WILDCARD`
+    :returns: number of fixed positions
+    """
+    return sum([1 for val in I_star if val == 0 or val == 1])
+
+
 def check_size(indices: list, queries: list) -> int:
     """ Check whether size of all indices and queries are the same
 
@@ -55,9 +64,38 @@ def check_size(indices: list, queries: list) -> int:
 
 
 def get_unit_element(group, component):
-    """ Get unit element of a group component (ZR, G1, G2, or GT)
+    """ Get unit element of a group component (ZR, G1, G2, or GT).
+    The unit element is cached by the group.
 
     :param PairingGroup group: a group object
     :param int component: a group component (ZR, G1, G2, or GT)
     """
-    return group.random(component) ** 0
+    return group.unit_element(component)
+
+
+def is_unit_element(group, element, component) -> bool:
+    """ Check whether an element is the unit element of a group component (ZR, G1, G2, or GT).
+    This is the comparison used by predicate-only queries.
+
+    :param PairingGroup group: a group object
+    :param element: an element of the group component
+    :param int component: a group component (ZR, G1, G2, or GT)
+    :returns: whether `element` is the unit element
+    """
+    return element == group.unit_element(component)
+
+
+def fixed_base(element):
+    """ Copy an element and initialize the fixed-base pre-computation table of the copy.
+    Powers of the copy with any exponent use the table.
+
+    PBC builds a table of (bits / 5 + 1) * 32 elements, where bits is the bit length of the group order.
+    For the samples in `pairingcurves.py`, a table of G1 elements takes roughly 440 KB (A1_256),
+    1.7 MB (A1_512) and 6.7 MB (A1_1024), and 135 KB for the type A sample.
+
+    :param element: an element of G1, G2 or GT
+    :returns: the copy with a pre-computation table
+    """
+    base = element ** 1
+    assert base.initPP(), "ERROR: Failed to init pre-computation table."
+    return base
@@ -1,6 +1,9 @@
+import base64
+import hashlib
+
 try:
     from charm.toolbox.pairingcurves import params as param_info
-    from charm.core.math.pairing import pairing, ZR, G1, G2, GT, init, pair, hashPair,\
+    from charm.core.math.pairing import pairing, pc_element, ZR, G1, G2, GT, init, pair, hashPair,\
         H, random, serialize, deserialize, ismember, order
     import charm.core.math.pairing as pg
     from charm.config import libs, pairing_lib
@@ -17,6 +20,8 @@ class PairingGroup(object):
         self.Pairing = None
         self.secparam = secparam  # number of bits
         self._verbose = verbose
+        self._source = None  # (init method, parameter) to rebuild the group when unpickled
+        self._unit_elements = dict()
 
     def init_from_id(self, inParamId):
         """ Initialize pairing from pre-defined ID
@@ -34,6 +39,7 @@ class PairingGroup(object):
         elif type(inParamId) == int:
             self.Pairing = pairing(inParamId)
             self.param = inParamId
+        self._source = ('id', inParamId)
 
     def init_from_str(self, inParamId):
         """ Initialize pairing from content as a string.
@@ -42,6 +48,7 @@ class PairingGroup(object):
         if type(inParamId) == str and pairing_lib == libs.pbc:
             self.Pairing = pairing(string=inParamId)
             self.param = inParamId
+            self._source = ('str', inParamId)
 
     def init_from_file(self, paramFile):
         """ Initialize pairing from a param file.
@@ -55,6 +62,12 @@ class PairingGroup(object):
     def __str__(self):
         return str(self.Pairing)
 
+    def __reduce__(self):
+        """ A group is pickled as its parameters and is rebuilt once per process, see `load_group`
+        """
+        assert self._source is not None, "Error: cannot pickle a group which is not initialized"
+        return (load_group, self._source)
+
     def order(self):
         """returns the order of the group"""
         return order(self.Pairing)
@@ -62,6 +75,20 @@ class PairingGroup(object):
     def paramgen(self, qbits, rbits):
         return None
 
+    def is_symmetric(self) -> bool:
+        """ Whether G1 and G2 are the same group, i.e. the pairing is of type 1.
+        PBC types 'a', 'a1' and 'e' are symmetric, e.g. 'SS512',
+        while types 'd', 'f' and 'g' are asymmetric, e.g. 'MNT224'.
+        With MIRACL or RELIC, only the 'SS' curves are symmetric.
+        """
+        assert self._source is not None, "Error: the group is not initialized"
+        (method, param) = self._source
+        if method == 'id':
+            if pairing_lib != libs.pbc:
+                return str(param).startswith('SS')
+            param = param_info[param]
+        return parse_params_from_string(param)['type'] in ('a', 'a1', 'e')
+
     def ismember(self, obj):
         """membership test for a pairing object"""
         return ismember(self.Pairing, obj)
@@ -107,6 +134,13 @@ class PairingGroup(object):
             return random(self.Pairing, _type)
         return None
 
+    def unit_element(self, _type=GT):
+        """ Get the identity element of ZR, G1, G2 or GT. It is computed once and then cached.
+        """
+        if _type not in self._unit_elements:
+            self._unit_elements[_type] = self.random(_type) ** 0
+        return self._unit_elements[_type]
+
     def __randomGT(self):
         if not hasattr(self, 'gt'):
             self.gt = pair(self.random(G1), self.random(G2))
@@ -145,6 +179,15 @@ class PairingGroup(object):
         """
         return serialize(obj, compression)
 
+    def element_length(self, obj, compression=True):
+        """ Number of bytes of the binary representation of a pairing object,
+        i.e. the output of `serialize` without its type prefix and base64 encoding.
+
+           :param compression: length of the compressed representation. Default is True.
+        """
+        data = self.serialize(obj, compression=compression)
+        return len(base64.b64decode(data.split(b':', 1)[1]))
+
     def deserialize(self, obj, compression=True):
         """Deserialize a bytes serialized element into a pairing object.
 
@@ -201,6 +244,277 @@ class PairingGroup(object):
         return pg.GetBenchmark(self.Pairing, option)
 
 
+_registry = dict()
+_loaded_groups = dict()
+
+
+def canonical_params(params) -> str:
+    """ Canonical string representation of group parameters in PBC format:
+    'type' first, then the other parameters sorted by name
+
+    :param params: group parameters as a dict or a string in PBC format
+    :returns: canonical string representation
+    """
+    if isinstance(params, str):
+        params = parse_params_from_string(params)
+    keys = sorted(params.keys(), key=lambda key: (key != 'type', key))
+    return convert_params_to_string({key: params[key] for key in keys})
+
+
+def get_group(params) -> PairingGroup:
+    """ Get the initialized group of the given parameters from the process-wide registry.
+    The group is initialized at the first call and then shared,
+    together with its cached identity elements.
+
+    :param params: group parameters as a dict or a string in PBC format
+    :returns: the shared initialized group
+    """
+    param_str = canonical_params(params)
+    key = hashlib.sha256(param_str.encode('utf-8')).hexdigest()
+    group = _registry.get(key)
+    if group is None:
+        group = PairingGroup()
+        group.init_from_str(param_str)
+        _registry[key] = group
+    return group
+
+
+def load_group(method: str, param) -> PairingGroup:
+    """ Get a group initialized by `init_from_id` or `init_from_str` with `param`.
+    The group is initialized only once per process and then shared,
+    groups initialized from a string come from the registry of `get_group`.
+
+    :param str method: 'id' or 'str'
+    :param param: parameter of the init method
+    :returns: the initialized group
+    """
+    if method == 'str':
+        return get_group(param)
+
+    group = _loaded_groups.get(param)
+    if group is None:
+        group = PairingGroup()
+        group.init_from_id(param)
+        _loaded_groups[param] = group
+    return group
+
+
+class EncodedElement(object):
+    """ A group element serialized to bytes
+    """
+    __slots__ = ('data', 'compression')
+
+    def __init__(self, data: bytes, compression: bool):
+        self.data = data
+        self.compression = compression
+
+
+class GroupPlaceholder(object):
+    """ Stands for the pairing group of encoded elements
+    """
+    __slots__ = ()
+
+
+def encode_elements(obj, group: PairingGroup, compression=True):
+    """ Replace group elements in (nested) dicts, lists and tuples with their serialized bytes
+    and the pairing group with a placeholder, so that the result can be pickled
+
+    :param obj: object to encode
+    :param PairingGroup group: the pairing group of the elements
+    :param bool compression: whether or not to serialize elements in compressed form
+    :returns: the encoded object
+    """
+    if type(obj) == pc_element:
+        return EncodedElement(group.serialize(obj, compression=compression), compression)
+    if isinstance(obj, PairingGroup):
+        return GroupPlaceholder()
+    if isinstance(obj, dict):
+        return {key: encode_elements(val, group, compression) for key, val in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(encode_elements(val, group, compression) for val in obj)
+    return obj
+
+
+def decode_elements(obj, group: PairingGroup):
+    """ Reverse `encode_elements`
+
+    :param obj: object to decode
+    :param PairingGroup group: the pairing group of the elements
+    :returns: the decoded object
+    """
+    if isinstance(obj, EncodedElement):
+        return group.deserialize(obj.data, compression=obj.compression)
+    if isinstance(obj, GroupPlaceholder):
+        return group
+    if isinstance(obj, dict):
+        return {key: decode_elements(val, group) for key, val in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(decode_elements(val, group) for val in obj)
+    return obj
+
+
+class GroupDict(dict):
+    """ A dict of group elements, possibly nested in dicts, lists and tuples, which can be pickled.
+
+    Keys are `GroupDict`s, cipher texts and tokens are `GroupRecord`s.
+    They are pickled as the parameters of their group and the compressed bytes of their elements,
+    or the uncompressed bytes when wrapped in `Uncompressed`.
+    Pre-computation tables (`initPP`) are not pickled.
+    """
+
+    def __init__(self, group: PairingGroup, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.group = group
+
+    def __reduce__(self):
+        return self._reduce(compression=True)
+
+    def _reduce(self, compression: bool) -> tuple:
+        return (_load_group_dict, (self.group, encode_elements(dict(self), self.group, compression)))
+
+
+def _load_group_dict(group: PairingGroup, encoded: dict) -> GroupDict:
+    return GroupDict(group, decode_elements(encoded, group))
+
+
+class GroupRecord(object):
+    """ A record of group elements with a fixed set of fields, stored in `__slots__`.
+
+    Cipher texts and tokens are `GroupRecord`s, which take less memory than `GroupDict`s
+    because they have no per-object dict, and positional components are stored in tuples.
+    They keep dict-style access, e.g. `cipher['C_1'][i]`, `'indices' in token` or `token['group']`.
+    A field which is `None` is missing from the dict view.
+    They are pickled like `GroupDict`s.
+
+    Subclasses list their fields in both `__slots__` and `_fields`.
+    """
+    __slots__ = ('group',)
+    _fields = ()
+
+    def __init__(self, group: PairingGroup, **fields):
+        self.group = group
+        for field in self._fields:
+            setattr(self, field, fields.pop(field, None))
+        assert not fields, "Error: unknown fields %s" % list(fields)
+
+    def __getitem__(self, key):
+        if key == 'group':
+            return self.group
+        if key in self._fields:
+            value = getattr(self, key)
+            if value is not None:
+                return value
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key) -> bool:
+        return key in self._fields and getattr(self, key) is not None
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self.keys())
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def keys(self) -> list:
+        return [field for field in self._fields if getattr(self, field) is not None]
+
+    def values(self) -> list:
+        return [getattr(self, field) for field in self.keys()]
+
+    def items(self) -> list:
+        return [(field, getattr(self, field)) for field in self.keys()]
+
+    def __reduce__(self):
+        return self._reduce(compression=True)
+
+    def _reduce(self, compression: bool) -> tuple:
+        values = tuple(getattr(self, field) for field in self._fields)
+        return (_load_group_record, (type(self), self.group, encode_elements(values, self.group, compression)))
+
+
+def _load_group_record(cls, group: PairingGroup, encoded: tuple) -> GroupRecord:
+    return cls(group, **dict(zip(cls._fields, decode_elements(encoded, group))))
+
+
+class Uncompressed(object):
+    """ Wraps a `GroupDict` or a `GroupRecord`, or a list or tuple of them,
+    so that their elements are pickled uncompressed.
+
+    Uncompressed elements take about twice the space of compressed ones,
+    but deserializing them does not need a square root per point.
+    It suits objects sent to worker processes, while stored objects stay compressed.
+    The wrapper is unpickled as the wrapped object, and other objects are pickled as usual.
+    """
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __reduce__(self):
+        if isinstance(self.obj, (list, tuple)):
+            return (type(self.obj), ([Uncompressed(item) for item in self.obj],))
+        if isinstance(self.obj, (GroupDict, GroupRecord)):
+            return self.obj._reduce(compression=False)
+        return (_unwrap, (self.obj,))
+
+
+def _unwrap(obj):
+    return obj
+
+
+class Prepared(object):
+    """ Base class of keys and tokens with pre-computed values, e.g. `hve.PreparedToken` or `hve.PreparedPublicKey`.
+    A prepared token is evaluated against many cipher texts, and a prepared key serves many encryptions or tokens.
+
+    A prepared object can be used in place of the object it wraps:
+    the keys listed in `_prepared_keys` give the attribute of the same name,
+    e.g. a table of pre-computed powers, and the other keys give the value of the wrapped object,
+    e.g. `prepared['group']`.
+    It is pickled as the wrapped object, which is prepared again when unpickled.
+    """
+    _prepared_keys = ()
+
+    def __init__(self, obj):
+        """
+        :param obj: the key or token to prepare
+        """
+        self.obj = obj
+        self.group = obj['group']
+
+    def __getitem__(self, key):
+        if key in self._prepared_keys:
+            return getattr(self, key)
+        return self.obj[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self._prepared_keys or key in self.obj
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def __reduce__(self):
+        return (type(self), (self.obj,))
+
+    @classmethod
+    def prepare(cls, obj):
+        """ Prepare `obj` unless it is already prepared
+
+        :param obj: the key or token, or the prepared object
+        :returns: the prepared object
+        """
+        if isinstance(obj, cls):
+            return obj
+        return cls(obj)
+
+
 def convert_params_to_string(params: dict) -> str:
     """ Create a string representation of parameters in PBC format
     """
@@ -220,12 +534,13 @@ def parse_params_from_string(paramStr: str) -> dict:
 
 
 def parse_param_line(line: str) -> tuple:
+    """ Split a line into the name and the value of a parameter.
+    ',', ':' and a standalone '-' separate them, while the sign of a value such as `sign1 -1` is kept
     """
-    """
-    replacements = (',', '-', ':')
+    replacements = (',', ':')
     for r in replacements:
         line = line.replace(r, ' ')
-    elements = line.split()
+    elements = [element for element in line.split() if element != '-']
     name = elements[0]
     value = elements[1]
 
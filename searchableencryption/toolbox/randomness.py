@@ -0,0 +1,37 @@
+""" Random integer exponents drawn in batches from the randomness of the operating system.
+
+Drawing an exponent with Charm's `IntegerGroup.random` allocates a Charm integer
+which is then converted to a Python int, one exponent at a time.
+`random_exponents` reads the randomness of a whole batch with a single `os.urandom` call
+and converts it to Python ints directly.
+
+Each exponent is reduced from 64 more bits than the modulus,
+so its statistical distance from the uniform distribution is less than 2 ** -64.
+"""
+import os
+
+_EXTRA_BYTES = 8
+
+
+def random_exponents(modulus: int, count: int) -> list:
+    """ Draw random exponents in [0, modulus)
+
+    :param int modulus: the modulus, e.g. the order of a group
+    :param int count: number of exponents
+    :returns: list of exponents as Python ints
+    """
+    modulus = int(modulus)
+    assert modulus > 0, "Error: modulus must be positive"
+
+    num_bytes = (modulus.bit_length() + 7) // 8 + _EXTRA_BYTES
+    buf = os.urandom(num_bytes * count)
+    return [int.from_bytes(buf[i:i + num_bytes], 'big') % modulus for i in range(0, num_bytes * count, num_bytes)]
+
+
+def random_exponent(modulus: int) -> int:
+    """ Draw a random exponent in [0, modulus)
+
+    :param int modulus: the modulus, e.g. the order of a group
+    :returns: the exponent as a Python int
+    """
+    return random_exponents(modulus, 1)[0]
@@ -10,6 +10,15 @@ exp1 107
 sign1 1
 sign0 1"""
 
+PAIRING_CURVE_TYPE_A_512_NEGATIVE_SIGN_SAMPLE = """type a
+q 10046035775633259399070479179563901798152874439292404847228280779617369695794133687291976523413190171553742065460876441670006144842987450974622787339026299
+h 13760991695940429069664925371812521644779389935009686742425533036321537256530908848420111318660754119327876
+r 730037194819098479161313273373416762259774898175
+exp2 159
+exp1 149
+sign1 -1
+sign0 -1"""
+
 PAIRING_CURVE_TYPE_A1_256_SAMPLE = """type a1
 p 7140470261544046663351344913180251735054977290544774928318428382977222614514167629528514132086200398941135403930111045626642234545076486933849590399157217739
 n 6263570404863198827501179748403729592153488851355065726595112616646686503959796166253082572005438946439592459587816706690037047846558321871797886315050191
@@ -1,11 +1,11 @@
 """ Benchmark HVE component
 """
 import csv
+import sys
 import time
-import math
 from collections import defaultdict
-from .context import hve, hvehelper, util, parse_params_from_string, \
-    pairingcurves, pairinggroup
+from .context import hve, hveprime, hvehelper, util, parse_params_from_string, \
+    pairingcurves, pairinggroup, serialization, blindingpool
 from .test_hve import create_random_test
 
 from charm.toolbox.integergroup import IntegerGroup
@@ -46,7 +46,7 @@ def benchmark_hve_sigle_set(
         end_time = time.time()
         bm_values[METHOD_ENCRYPT].append(end_time - start_time)
 
-        bm_values[CIPHER_TEXT_SIZE].append(get_ctx_size(C_i))
+        bm_values[CIPHER_TEXT_SIZE].append(len(serialization.encode_ciphertext(C_i, pk['group'])))
 
         C.append(C_i)
 
@@ -55,7 +55,7 @@ def benchmark_hve_sigle_set(
         token = hve.gen_token(sk, query)
         end_time = time.time()
         bm_values[METHOD_GEN_TOKEN].append(end_time - start_time)
-        bm_values[TOKEN_SIZE].append(get_ctx_size(token))
+        bm_values[TOKEN_SIZE].append(len(serialization.encode_token(token, pk['group'])))
 
         for ci, cipher in enumerate(C):
             start_time = time.time()
@@ -66,42 +66,6 @@ def benchmark_hve_sigle_set(
     return bm_values
 
 
-def get_ctx_size(cipher_text):
-    """
-    """
-    ct_sizeinbytes = 0
-    for key, elem in cipher_text.items():
-        if type(elem) == list:
-            # 1 byte for each element in the list
-            ct_sizeinbytes += len(elem)
-        elif type(elem) == dict:
-            # 1 byte for each element in the dict
-            ct_sizeinbytes += len(elem)
-            for val in elem.values():
-                ct_sizeinbytes += get_element_size(val)
-        else:
-            # this is an Element type
-            ct_sizeinbytes += get_element_size(elem)
-
-    return ct_sizeinbytes
-
-
-def get_element_size(element):
-    """
-    """
-    # this is an Element type
-    elem_sizeinbytes = 0
-    # extract integers from elem
-    str_rep = ''.join(filter(lambda c: c == ' ' or c.isdigit(), str(element)))
-    delim_size = len(str(element)) - len(str_rep)  # number of delimiter characters
-    elem_sizeinbytes += delim_size
-    L = [int(s) for s in str_rep.split()]
-    for x in L:
-        intsize = int(math.ceil(math.log2(x) / 8))
-        elem_sizeinbytes += intsize
-    return elem_sizeinbytes
-
-
 def benchmark_hve_sigle_operation():
     """
     """
@@ -126,8 +90,10 @@ def benchmark_hve_sigle_operation():
             p = int(groupParam[hvehelper.PARAM_KEY_N0])
             q = int(groupParam[hvehelper.PARAM_KEY_N1])
 
-            group = pairinggroup.PairingGroup()
-            group.init_from_str(pairinggroup.convert_params_to_string(groupParam))
+            group_param_copy = groupParam.copy()  # remove private components of the group parameters
+            group_param_copy.pop(util.PARAM_KEY_N0, None)
+            group_param_copy.pop(util.PARAM_KEY_N1, None)
+            group = pairinggroup.get_group(group_param_copy)
 
             start_time = time.time()
             for _ in range(num_runs):
@@ -153,7 +119,7 @@ def benchmark_hve_sigle_operation():
             end_time = time.time()
             time_random_element_zr = (end_time - start_time) / num_runs
             print('time_random_element_zr=', time_random_element_zr)
-            a = int(hve.random_zr(int_group, p))
+            a = int(int_group.random(max=int(p)))
 
             g = hve.random_gp(group, p, q)
             v = hve.random_gp(group, p, q)
@@ -267,5 +233,167 @@ def benchmark_hve():
                                     encrypt_avg, gen_token_avg, query_avg, ctx_avg, token_avg])
 
 
+def benchmark_sparse_token():
+    """ Benchmark token size and gen_token time of sparse tokens against dense tokens
+    """
+    groupParam = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    widths = [16, 64, 256]
+    num_queries = 5
+
+    headers = ['width', 'num_wildcards', 'dense_gen_token_avg', 'sparse_gen_token_avg',
+               'dense_token_avg', 'sparse_token_avg']
+    with open('benchmark_sparse_token.csv', 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(headers)
+        for width in widths:
+            (pk, sk) = hve.setup(width=width, group_param=groupParam)
+            for num_wildcards in [int(width / 4), int(width / 2), int(3 * width / 4)]:
+                (indices, queries, results) = create_random_test(width, 0, num_queries, num_wildcards)
+
+                bm_values = defaultdict(list)
+                for query in queries:
+                    for sparse in [False, True]:
+                        start_time = time.time()
+                        token = hve.gen_token(sk, query, sparse=sparse)
+                        end_time = time.time()
+                        bm_values[(METHOD_GEN_TOKEN, sparse)].append(end_time - start_time)
+                        bm_values[(TOKEN_SIZE, sparse)].append(len(serialization.encode_token(token, sk['group'])))
+
+                row = [width, num_wildcards]
+                for key in [METHOD_GEN_TOKEN, TOKEN_SIZE]:
+                    for sparse in [False, True]:
+                        row.append(sum(bm_values[(key, sparse)]) / len(bm_values[(key, sparse)]))
+                print(' '.join([str(val) for val in row]))
+                writer.writerow(row)
+
+
+def get_object_size(obj) -> int:
+    """ Size in bytes of the Python objects of a cipher text or token:
+    its containers, their keys and the element objects (not the memory allocated by PBC,
+    which is the same for any layout)
+    """
+    if isinstance(obj, pairinggroup.PairingGroup):
+        # the group is shared
+        return 0
+    size = sys.getsizeof(obj)
+    if isinstance(obj, pairinggroup.GroupRecord):
+        size += sum(get_object_size(val) for val in obj.values())
+    elif isinstance(obj, dict):
+        size += sum(sys.getsizeof(key) + get_object_size(val) for key, val in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(get_object_size(val) for val in obj)
+    return size
+
+
+def benchmark_ciphertext_memory():
+    """ Benchmark the in-memory size of a cipher text as a `GroupRecord` with tuples
+    against the former layout, a `GroupDict` with dicts keyed by position
+    """
+    groupParam = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    widths = [16, 64, 256, 1024]
+
+    headers = ['width', 'dict_bytes', 'record_bytes', 'serialized_bytes']
+    with open('benchmark_ciphertext_memory.csv', 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(headers)
+        for width in widths:
+            (pk, sk) = hve.setup(width=width, group_param=groupParam)
+            (indices, queries, results) = create_random_test(width, 1, 0, 0)
+            cipher = hve.encrypt(pk, indices[0])
+            cipher_dict = pairinggroup.GroupDict(pk['group'],
+                                                 {'C_prime': cipher['C_prime'],
+                                                  'C_0': cipher['C_0'],
+                                                  'C_1': dict(enumerate(cipher['C_1'])),
+                                                  'C_2': dict(enumerate(cipher['C_2']))})
+
+            row = [width, get_object_size(cipher_dict), get_object_size(cipher),
+                   len(serialization.encode_ciphertext(cipher, pk['group']))]
+            print(' '.join([str(val) for val in row]))
+            writer.writerow(row)
+
+
+def benchmark_blinding_pool():
+    """ Benchmark the online cost of `hve.encrypt` with a pool of blinding factors filled beforehand
+    against `hve.encrypt` without a pool, and the offline cost of filling the pool
+    """
+    groupParam = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    widths = [16, 64, 256]
+    num_indices = 20
+
+    headers = ['width', 'encrypt_avg', 'pool_encrypt_avg', 'refill_avg']
+    with open('benchmark_blinding_pool.csv', 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(headers)
+        for width in widths:
+            (indices, queries, results) = create_random_test(width, num_indices, 0, 0)
+            (pk, sk) = hve.setup(width=width, group_param=groupParam)
+            pk = hve.PreparedPublicKey(pk)
+
+            start_time = time.time()
+            hve.encrypt_many(pk, indices)
+            encrypt_avg = (time.time() - start_time) / num_indices
+
+            pool = blindingpool.BlindingPool(pk, size=(2 * width + 1) * num_indices)
+            start_time = time.time()
+            pool.refill()
+            refill_avg = (time.time() - start_time) / num_indices
+
+            start_time = time.time()
+            hve.encrypt_many(pk, indices, pool=pool)
+            pool_encrypt_avg = (time.time() - start_time) / num_indices
 
+            row = [width, encrypt_avg, pool_encrypt_avg, refill_avg]
+            print(' '.join([str(val) for val in row]))
+            writer.writerow(row)
 
+
+def benchmark_hveprime_curves():
+    """ Benchmark `hveprime` over the symmetric 512-bit type A sample against the asymmetric MNT224 curve
+    """
+    curves = {'A_512': parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A_512_SAMPLE),
+              'MNT224': 'MNT224'}
+
+    widths = [16, 64, 256]
+    num_indices = 5
+    num_queries = 5
+    num_wildcards = 4
+
+    headers = ['curve', 'width', 'setup', 'encrypt_avg', 'gen_token_avg', 'query_avg', 'ctx_size', 'token_size']
+    with open('benchmark_hveprime_curves.csv', 'w') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(headers)
+        for curve, groupParam in curves.items():
+            for width in widths:
+                (indices, queries, results) = create_random_test(width, num_indices, num_queries, num_wildcards)
+
+                start_time = time.time()
+                (pk, sk) = hveprime.setup(width=width, group_param=groupParam)
+                setup_time = time.time() - start_time
+                group = pk['group']
+
+                pk = hveprime.PreparedPublicKey(pk)
+                start_time = time.time()
+                C = hveprime.encrypt_many(pk, indices)
+                encrypt_avg = (time.time() - start_time) / num_indices
+
+                sk = hveprime.PreparedSecretKey(sk)
+                start_time = time.time()
+                tokens = hveprime.gen_tokens(sk, queries)
+                gen_token_avg = (time.time() - start_time) / num_queries
+                tokens = [hveprime.prepare_token(token) for token in tokens]
+
+                start_time = time.time()
+                for token in tokens:
+                    for cipher in C:
+                        hveprime.match(token, cipher)
+                query_avg = (time.time() - start_time) / (num_indices * num_queries)
+
+                ctx_size = len(serialization.encode_ciphertext(C[0], group, serialization.SCHEME_HVE_PRIME))
+                token_size = len(serialization.encode_token(tokens[0].obj, group, serialization.SCHEME_HVE_PRIME))
+
+                row = [curve, width, setup_time, encrypt_avg, gen_token_avg, query_avg, ctx_size, token_size]
+                print(' '.join([str(val) for val in row]))
+                writer.writerow(row)
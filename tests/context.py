@@ -12,4 +12,4 @@ from searchableencryption.toolbox.pairinggroup import GT, parse_params_from_stri
 from searchableencryption.hve.util import WILDCARD  # noqa: W391, F401
 from searchableencryption.toolbox import binexprminimizer  # noqa: W391, F401
 from searchableencryption.hve import hierarchicalencoding, greyencoding, util  # noqa: W391, F401
-from searchableencryption.hve import hve, hveprime  # noqa: W391, F401
\ No newline at end of file
+from searchableencryption.hve import hve, hveprime, blindingpool, searchengine, serialization, store  # noqa: W391, F401
\ No newline at end of file
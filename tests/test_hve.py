@@ -2,8 +2,12 @@
 """
 Tests the correctness of the implementation of HVE encryption.
 """
+import os
+import pickle
 import random  # noqa: E402
-from .context import hve, hvehelper, pairingcurves, GT, parse_params_from_string, WILDCARD
+import tempfile
+from .context import hve, hvehelper, pairingcurves, pairinggroup, GT, parse_params_from_string, WILDCARD, \
+    blindingpool, searchengine, serialization, store
 
 
 def create_hardcoded_test():
@@ -207,3 +211,380 @@ def test_hve_multiple():
         results = hvehelper.run_hve_multiple(hve_quadruple, t[0], t[1], group_param)
         for i, expectedResult in enumerate(expected_results):
             assert set(expectedResult) == set(results[i]), 'Incorrect matched items'
+
+
+def test_hve_query_reference():
+    """ Cross-check the multi-pairing query with the reference query
+    """
+    print("Start test_hve_query_reference()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param)
+    group = pk['group']
+
+    for qi, I_star in enumerate(queries):
+        token = hve.gen_token(sk, I_star)
+        for ci, I in enumerate(indices):  # noqa: E741
+            M = group.random(GT)
+            cipher = hve.encrypt(pk, I, M)
+
+            M_prime = hve.query(token, cipher)
+            assert M_prime == hve.query_reference(token, cipher), 'Queries do not agree'
+            assert (M_prime == M) == (ci in results[qi]), 'Incorrect decryption'
+
+            matched = hve.query(token, cipher, predicate_only=True, group=group)
+            assert matched == hve.query_reference(token, cipher, predicate_only=True, group=group), \
+                'Predicates do not agree'
+            assert matched == hve.match(token, cipher), 'Match does not agree'
+
+            cipher = hve.encrypt(pk, I)
+            matched = hve.query(token, cipher, predicate_only=True, group=group)
+            assert matched == (ci in results[qi]), 'Incorrect match'
+            assert matched == hve.match(token, cipher), 'Match does not agree'
+            assert matched == hve.match(hve.prepare_token(token), cipher), 'Prepared token does not agree'
+
+
+def test_hve_encrypt_many():
+    """ Encrypt with a prepared public key
+    """
+    print("Start test_hve_encrypt_many()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param)
+
+    prepared_pk = hve.PreparedPublicKey(pk)
+    assert prepared_pk['group'] is pk['group'] and prepared_pk['U'] is pk['U'], 'Incorrect key lookup'
+    assert hve.PreparedPublicKey.prepare(prepared_pk) is prepared_pk, 'Key is prepared again'
+    prepared_pk = pickle.loads(pickle.dumps(prepared_pk))
+    C = hve.encrypt_many(prepared_pk, indices)
+    C.append(hve.encrypt(prepared_pk, indices[0]))
+    for qi, I_star in enumerate(queries):
+        token = hve.gen_token(sk, I_star)
+        matches = [ci for ci, cipher in enumerate(C[:-1]) if hve.query(token, cipher, predicate_only=True)]
+        assert set(matches) == set(results[qi]), 'Incorrect matched items'
+        assert hve.query(token, C[-1], predicate_only=True) == (0 in results[qi]), 'Incorrect match'
+
+
+def test_hve_blinding_pool():
+    """ Encrypt with a pool of pre-computed blinding factors
+    """
+    print("Start test_hve_blinding_pool()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param)
+
+    # the pool is too small for all indices, so some blinding factors are computed inline
+    pool = blindingpool.BlindingPool(pk, size=40)
+    assert pool.refill(10) == 10 and pool.refill() == 30 and pool.refill() == 0, 'Incorrect refill'
+    assert len(pool) == 40, 'The pool is not full'
+    C = hve.encrypt_many(pk, indices, pool=pool)
+    assert len(pool) == 0, 'The pool is not drained'
+
+    for qi, I_star in enumerate(queries):
+        token = hve.gen_token(sk, I_star)
+        matches = [ci for ci, cipher in enumerate(C) if hve.query(token, cipher, predicate_only=True)]
+        assert set(matches) == set(results[qi]), 'Incorrect matched items'
+
+
+def test_hve_ciphertext_record():
+    """ Cipher texts and tokens store positional components in tuples with dict-style access
+    """
+    print("Start test_hve_ciphertext_record()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (pk, sk) = hve.setup(width=5, group_param=group_param)
+    cipher = hve.encrypt(pk, [0, 0, 1, 0, 0])
+    assert type(cipher['C_1']) == tuple and len(cipher['C_1']) == 5, 'Components are not in a tuple'
+    assert set(cipher.keys()) == {'C_prime', 'C_0', 'C_1', 'C_2'}, 'Incorrect keys'
+    assert not hasattr(cipher, '__dict__'), 'Cipher text has a dict'
+
+    token = hve.gen_token(sk, [0, WILDCARD, 1, 0, 0])
+    assert 'indices' not in token and token['group'] is pk['group'], 'Incorrect dict-style access'
+    assert 'indices' in hve.gen_token(sk, [0, WILDCARD, 1, 0, 0], sparse=True), 'Token is not sparse'
+
+    cipher = pickle.loads(pickle.dumps(cipher))
+    assert hve.match(pickle.loads(pickle.dumps(token)), cipher), 'Incorrect match'
+
+
+def test_hve_sparse_token():
+    """ Query with sparse tokens
+    """
+    print("Start test_hve_sparse_token()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param)
+    C = [hve.encrypt(pk, I) for I in indices]  # noqa: E741
+
+    for qi, I_star in enumerate(queries):
+        token = hve.gen_token(sk, I_star, sparse=True)
+        assert len(token['K_1']) == len(I_star) - I_star.count(WILDCARD), 'Token is not sparse'
+
+        matches = [ci for ci, cipher in enumerate(C) if hve.query(token, cipher, predicate_only=True)]
+        assert set(matches) == set(results[qi]), 'Incorrect matched items'
+
+
+def test_hve_search_engine():
+    """ Search with and without worker processes
+    """
+    print("Start test_hve_search_engine()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param)
+    C = hve.encrypt_many(pk, indices)
+    tokens = [hve.gen_token(sk, I_star) for I_star in queries]
+
+    for max_workers in [0, 2]:
+        with searchengine.SearchEngine(hve.query, pk['group'], max_workers=max_workers, chunk_size=1,
+                                       prepare_token=hve.prepare_token) as engine:
+            matches = engine.search(tokens, C)
+            for empty in [[], iter([])]:
+                assert engine.search(tokens, empty) == [[] for _ in tokens], 'Matches of no cipher text'
+                assert list(engine.iter_search(tokens, empty)) == [], 'Matches of no cipher text'
+        for i, expected_result in enumerate(results):
+            assert set(expected_result) == set(matches[i]), 'Incorrect matched items'
+
+
+def test_hve_iter_search():
+    """ Stream matches from a generator of cipher texts and stop early
+    """
+    print("Start test_hve_iter_search()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    expected_pairs = sorted((ci, ti) for ti, result in enumerate(results) for ci in result)
+
+    pairs = hvehelper.iter_hve_multiple((hve.setup, hve.encrypt, hve.gen_token, hve.query),
+                                        iter(indices), queries, group_param)
+    assert sorted(pairs) == expected_pairs, 'Incorrect matched items'
+
+    (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param)
+    tokens = [hve.gen_token(sk, I_star) for I_star in queries]
+    assert list(hvehelper.iter_matches(hve.match, tokens, (hve.encrypt(pk, I) for I in indices))) == \
+        expected_pairs, 'Incorrect matched items'
+
+    for max_workers in [0, 2]:
+        with searchengine.SearchEngine(hve.query, pk['group'], max_workers=max_workers, chunk_size=1,
+                                       prepare_token=hve.prepare_token) as engine:
+            pairs = engine.iter_search(tokens, (hve.encrypt(pk, I) for I in indices), max_pending=2)
+            assert next(pairs) == expected_pairs[0], 'Incorrect first match'
+            pairs.close()
+            assert list(engine.iter_search(tokens, hve.encrypt_many(pk, indices))) == expected_pairs, \
+                'Incorrect matched items'
+
+
+def run_test_hve_pickle(hve_quadruple: tuple):
+    """ Keys, cipher texts and tokens still work after pickling
+    """
+    setup = hve_quadruple[0]
+    encrypt = hve_quadruple[1]
+    gen_token = hve_quadruple[2]
+    query = hve_quadruple[3]
+
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (pk, sk) = setup(width=5, group_param=group_param)
+    (pk, sk) = pickle.loads(pickle.dumps((pk, sk)))
+    group = pk['group']
+    assert group is sk['group'], 'Group is not shared'
+    assert group is setup(width=1, group_param=group_param)[0]['group'], 'Group is not from the registry'
+
+    I = [0, 0, 1, 0, 0]  # noqa: E741
+    M = group.random(GT)
+    cipher = pickle.loads(pickle.dumps(encrypt(pk, I, M)))
+
+    token = pickle.loads(pickle.dumps(gen_token(sk, [0, WILDCARD, 1, 0, 0])))
+    assert query(token, cipher) == M, 'Incorrect decryption'
+
+    token = pickle.loads(pickle.dumps(gen_token(sk, [0, WILDCARD, 0, 0, 0])))
+    assert not query(token, cipher, predicate_only=True, group=group), 'Incorrect match'
+
+    tokens = [gen_token(sk, [0, WILDCARD, 1, 0, 0]), gen_token(sk, [0, WILDCARD, 0, 0, 0])]
+    (tokens, ciphers) = pickle.loads(pickle.dumps(pairinggroup.Uncompressed((tokens, [cipher]))))
+    assert query(tokens[0], ciphers[0]) == M, 'Incorrect decryption of uncompressed pickles'
+    assert not query(tokens[1], ciphers[0], predicate_only=True, group=group), 'Incorrect match'
+
+
+def test_hve_pickle():
+    """ Pickle HVE keys, cipher texts and tokens
+    """
+    print("Start test_hve_pickle()")
+    run_test_hve_pickle((hve.setup, hve.encrypt, hve.gen_token, hve.query))
+
+
+def run_test_hve_serialization(hve_quadruple: tuple, scheme: int):
+    """ Keys, cipher texts and tokens still work after serialization, with and without compression
+    """
+    setup = hve_quadruple[0]
+    encrypt = hve_quadruple[1]
+    gen_token = hve_quadruple[2]
+    query = hve_quadruple[3]
+
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = setup(width=len(indices[0]), group_param=group_param)
+    group = pk['group']
+
+    for compression in [True, False]:
+        pk = serialization.decode_public_key(serialization.encode_public_key(pk, scheme, compression), group)
+        sk = serialization.decode_secret_key(serialization.encode_secret_key(sk, scheme, compression), group)
+
+        C = [encrypt(pk, I) for I in indices]
+        data = serialization.encode_ciphertexts(C, group, scheme, compression)
+        size = serialization.ciphertext_size(group, scheme, len(indices[0]), compression)
+        assert len(data) == serialization.HEADER_SIZE + len(C) * size, 'Incorrect size'
+        C = serialization.decode_ciphertexts(data, group)
+
+        for qi, I_star in enumerate(queries):
+            token = serialization.decode_token(serialization.encode_token(gen_token(sk, I_star), group, scheme,
+                                                                          compression), group)
+            matches = [ci for ci, cipher in enumerate(C) if query(token, cipher, predicate_only=True, group=group)]
+            assert set(matches) == set(results[qi]), 'Incorrect matched items'
+
+        M = group.random(GT)
+        data = serialization.encode_ciphertext(encrypt(pk, indices[0], M), group, scheme, compression)
+        assert len(data) == serialization.HEADER_SIZE + size, 'Incorrect size'
+        token = gen_token(sk, indices[0])
+        assert query(token, serialization.decode_ciphertext(data, group)) == M, 'Incorrect decryption'
+
+
+def test_hve_serialization():
+    """ Serialize HVE keys, cipher texts and tokens
+    """
+    print("Start test_hve_serialization()")
+    run_test_hve_serialization((hve.setup, hve.encrypt, hve.gen_token, hve.query), serialization.SCHEME_HVE)
+
+
+def test_hve_serialize_prepared_token():
+    """ Serialize prepared tokens, either sparse or not
+    """
+    print("Start test_hve_serialize_prepared_token()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param)
+    group = pk['group']
+    C = hve.encrypt_many(pk, indices)
+
+    for sparse in [False, True]:
+        for qi, I_star in enumerate(queries):
+            prepared = hve.prepare_token(hve.gen_token(sk, I_star, sparse=sparse))
+            assert ('indices' in prepared) == sparse, 'Incorrect optional key'
+            assert prepared.get('indices', 'missing') == ('missing' if not sparse else prepared['indices']), \
+                'Incorrect optional key'
+            token = serialization.decode_token(serialization.encode_token(prepared, group), group)
+            matches = [ci for ci, cipher in enumerate(C) if hve.match(token, cipher)]
+            assert set(matches) == set(results[qi]), 'Incorrect matched items'
+
+
+def run_test_hve_store(hve_quadruple: tuple, match, scheme: int):
+    """ Append cipher texts to a store, reopen it and scan it, also with worker processes
+    """
+    setup = hve_quadruple[0]
+    encrypt = hve_quadruple[1]
+    gen_token = hve_quadruple[2]
+    query = hve_quadruple[3]
+
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = setup(width=len(indices[0]), group_param=group_param)
+    group = pk['group']
+    tokens = [gen_token(sk, I_star) for I_star in queries]
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'ciphertexts.bin')
+        with store.CiphertextStore(path, group, scheme=scheme) as cipher_store:
+            for max_workers in [0, 2]:
+                with searchengine.SearchEngine(query, group, max_workers=max_workers) as engine:
+                    assert engine.search(tokens, cipher_store) == [[] for _ in tokens], 'Matches of an empty store'
+            cipher_store.append(encrypt(pk, indices[0]))
+            assert match(tokens[0], cipher_store[0]), 'Incorrect match'
+            cipher_store.extend(encrypt(pk, I) for I in indices[1:])
+
+        with store.CiphertextStore(path, group) as cipher_store:
+            assert len(cipher_store) == len(indices), 'Incorrect number of cipher texts'
+            assert cipher_store.width == len(indices[0]), 'Incorrect width'
+            assert match(tokens[1], cipher_store[-1]), 'Incorrect match'
+            assert len(cipher_store[1:3]) == 2, 'Incorrect slice'
+
+            matches = cipher_store.search(match, tokens, chunk_size=3)
+            for i, expected_result in enumerate(results):
+                assert set(expected_result) == set(matches[i]), 'Incorrect matched items'
+
+            expected_pairs = sorted((ci, ti) for ti, result in enumerate(results) for ci in result)
+            with searchengine.SearchEngine(query, group, max_workers=2, chunk_size=3) as engine:
+                matches = engine.search(tokens, cipher_store)
+                for i, expected_result in enumerate(results):
+                    assert set(expected_result) == set(matches[i]), 'Incorrect matched items'
+                assert list(engine.iter_search(tokens, cipher_store, max_pending=1)) == expected_pairs, \
+                    'Incorrect matched items'
+
+
+def test_hve_store():
+    """ Store HVE cipher texts in a file
+    """
+    print("Start test_hve_store()")
+    run_test_hve_store((hve.setup, hve.encrypt, hve.gen_token, hve.query), hve.match, serialization.SCHEME_HVE)
+
+
+def test_hve_setup_workers():
+    """ Spread setup over worker processes
+    """
+    print("Start test_hve_setup_workers()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    for max_workers in [3, None]:
+        (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param, max_workers=max_workers)
+        assert sorted(pk['U'].keys()) == list(range(len(indices[0]))), 'Missing positions'
+        C = hve.encrypt_many(pk, indices)
+        for qi, I_star in enumerate(queries):
+            token = hve.gen_token(sk, I_star)
+            matches = [ci for ci, cipher in enumerate(C) if hve.match(token, cipher)]
+            assert set(matches) == set(results[qi]), 'Incorrect matched items'
+
+
+def test_hve_extend():
+    """ Old cipher texts are still queryable after extending the width of the keys
+    """
+    print("Start test_hve_extend()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    width = len(indices[0])
+    (pk, sk) = hve.setup(width=width, group_param=group_param)
+    C = hve.encrypt_many(pk, indices)
+
+    (pk, sk) = hve.extend(pk, sk, width + 4)
+    assert len(pk['U']) == width + 4 and len(sk['u']) == width + 4, 'Incorrect width'
+    C_extended = hve.encrypt_many(pk, [I + [0, 1, 0, 0] for I in indices])
+
+    for qi, I_star in enumerate(queries):
+        token = hve.gen_token(sk, I_star + [WILDCARD] * 4)
+        matches = [ci for ci, cipher in enumerate(C) if hve.match(token, cipher)]
+        assert set(matches) == set(results[qi]), 'Incorrect matched items'
+
+        token = hve.gen_token(sk, I_star + [0, 1, WILDCARD, 0])
+        matches = [ci for ci, cipher in enumerate(C_extended) if hve.match(token, cipher)]
+        assert set(matches) == set(results[qi]), 'Incorrect matched items'
+
+
+def test_hve_gen_tokens():
+    """ Generate tokens with a prepared secret key, with and without worker processes
+    """
+    print("Start test_hve_gen_tokens()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = create_hardcoded_test()
+    (pk, sk) = hve.setup(width=len(indices[0]), group_param=group_param)
+    C = hve.encrypt_many(pk, indices)
+
+    for max_workers in [0, 2]:
+        tokens = hve.gen_tokens(sk, queries, max_workers=max_workers)
+        for qi, token in enumerate(tokens):
+            matches = [ci for ci, cipher in enumerate(C) if hve.match(token, cipher)]
+            assert set(matches) == set(results[qi]), 'Incorrect matched items'
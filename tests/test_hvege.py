@@ -65,3 +65,24 @@ def test_hve_ge_simple():
         print('Test FAILED.')
 
     print("Done test_hve_ge_simple")
+
+
+def test_ge_encode_cells():
+    """ Bulk encoding agrees with encoding one cell at a time
+    """
+    print("Start test_ge_encode_cells")
+    size = 4
+
+    rows = [random.randrange(2 ** size) for _ in range(50)]
+    cols = [random.randrange(2 ** size) for _ in range(50)]
+    bits = greyencoding.encode_cells(size, rows, cols)
+    assert bits.shape == (50, 2 * size) and bits.dtype == 'uint8', 'Incorrect shape'
+    for k in range(len(rows)):
+        assert list(bits[k]) == greyencoding.encode_cell_id(size, rows[k], cols[k]), 'Incorrect encoding'
+
+    for (row, col) in [(2 ** size, 0), (0, -1)]:
+        try:
+            greyencoding.encode_cells(size, [row], [col])
+        except AssertionError:
+            continue
+        assert False, 'Out-of-range cell was encoded'
@@ -1,7 +1,7 @@
 """ Test HVE with hierarchical encoding
 """
 import random  # noqa: E402
-from .context import hve, hierarchicalencoding, util, hvehelper, pairingcurves, GT,\
+from .context import hve, hveprime, hierarchicalencoding, util, hvehelper, pairingcurves, GT,\
     parse_params_from_string, WILDCARD, binexprminimizer
 
 
@@ -66,3 +66,69 @@ def test_hve_he_simple():
         print('Test FAILED.')
 
     print("Done test_hve_he_simple")
+
+
+def test_hve_he_match_any():
+    """ Region query with match_any for HVE and HVE with groups of prime order
+    """
+    print("Start test_hve_he_match_any")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    width = 4
+    cells = [[0, 1], [0, 2], [0, 3], [1, 2], [1, 3], [2, 3], [3, 3]]
+    cell_bins = [hierarchicalencoding.encode_cell_id(width, cell[0], cell[1]) for cell in cells]
+    I_stars = binexprminimizer.perform_bin_expr_min(cell_bins, wildcard=WILDCARD)
+
+    locations = [[2, 3], [2, 0], [0, 1], [3, 0]]
+    expected = [0, 2]
+
+    for scheme in [hve, hveprime]:
+        (pk, sk) = scheme.setup(width=width, group_param=group_param)
+        tokens = [scheme.gen_token(sk, I_star) for I_star in I_stars]
+        C = [scheme.encrypt(pk, hierarchicalencoding.encode_cell_id(width, row, col)) for row, col in locations]
+
+        matches = [ci for ci, cipher in enumerate(C) if scheme.match_any(tokens, cipher)]
+        assert matches == expected, 'Incorrect matched items'
+        assert scheme.match_any_scan(tokens, C) == expected, 'Incorrect matched items'
+
+
+def test_he_encode_cells():
+    """ Bulk encoding agrees with encoding one cell at a time, and decoding reverses it
+    """
+    print("Start test_he_encode_cells")
+    dim = 16
+
+    rows = [random.randrange(dim) for _ in range(50)]
+    cols = [random.randrange(dim) for _ in range(50)]
+    bits = hierarchicalencoding.encode_cells(dim, rows, cols)
+    assert bits.shape == (50, 8) and bits.dtype == 'uint8', 'Incorrect shape'
+    for k in range(len(rows)):
+        rep = hierarchicalencoding.encode_cell_id(dim, rows[k], cols[k])
+        assert list(bits[k]) == rep, 'Incorrect encoding'
+        assert hierarchicalencoding.decode_cell_id(dim, rep) == (rows[k], cols[k]), 'Incorrect decoding'
+
+    (decoded_rows, decoded_cols) = hierarchicalencoding.decode_cells(dim, bits)
+    assert list(decoded_rows) == rows and list(decoded_cols) == cols, 'Incorrect decoding'
+
+    for (row, col) in [(dim, 0), (0, -1)]:
+        try:
+            hierarchicalencoding.encode_cells(dim, [row], [col])
+        except AssertionError:
+            continue
+        assert False, 'Out-of-range cell was encoded'
+
+
+def test_he_encode_prefix():
+    """ A prefix query matches exactly the cells of the same block
+    """
+    print("Start test_he_encode_prefix")
+    dim = 8
+
+    for level in range(hierarchicalencoding.num_levels(dim) + 1):
+        I_star = hierarchicalencoding.encode_prefix(dim, 5, 2, level)
+        block = dim >> level
+        for row in range(dim):
+            for col in range(dim):
+                rep = hierarchicalencoding.encode_cell_id(dim, row, col)
+                matched = all(val == WILDCARD or val == bit for val, bit in zip(I_star, rep))
+                assert matched == (row // block == 5 // block and col // block == 2 // block), 'Incorrect prefix'
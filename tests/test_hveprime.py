@@ -1,5 +1,5 @@
-from .context import hvehelper, pairingcurves, parse_params_from_string
-from .context import hveprime
+from .context import hvehelper, pairingcurves, parse_params_from_string, GT, WILDCARD
+from .context import hveprime, serialization
 from . import test_hve
 
 
@@ -26,3 +26,115 @@ def test_hve_multiple():
         results = hvehelper.run_hve_multiple(hve_quadruple, t[0], t[1], group_param)
         for i, expectedResult in enumerate(expected_results):
             assert set(expectedResult) == set(results[i]), 'Incorrect matched items'
+
+
+def test_hve_pickle():
+    """ Pickle HVE keys, cipher texts and tokens
+    """
+    print("Start test_hve_pickle()")
+    hve_quadruple = (hveprime.setup, hveprime.encrypt, hveprime.gen_token, hveprime.query)
+    test_hve.run_test_hve_pickle(hve_quadruple)
+
+
+def test_hve_serialization():
+    """ Serialize HVE keys, cipher texts and tokens
+    """
+    print("Start test_hve_serialization()")
+    hve_quadruple = (hveprime.setup, hveprime.encrypt, hveprime.gen_token, hveprime.query)
+    test_hve.run_test_hve_serialization(hve_quadruple, serialization.SCHEME_HVE_PRIME)
+
+
+def test_hve_store():
+    """ Store HVE cipher texts in a file
+    """
+    print("Start test_hve_store()")
+    hve_quadruple = (hveprime.setup, hveprime.encrypt, hveprime.gen_token, hveprime.query)
+    test_hve.run_test_hve_store(hve_quadruple, hveprime.match, serialization.SCHEME_HVE_PRIME)
+
+
+def test_hve_encrypt_many():
+    """ Encrypt with a prepared public key
+    """
+    print("Start test_hve_encrypt_many()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = test_hve.create_hardcoded_test()
+    (pk, sk) = hveprime.setup(width=len(indices[0]), group_param=group_param)
+
+    prepared_pk = hveprime.PreparedPublicKey(pk)
+    C = hveprime.encrypt_many(prepared_pk, indices)
+    message = pk['group'].random(GT)
+    cipher_message = hveprime.encrypt(prepared_pk, indices[0], message)
+    for qi, I_star in enumerate(queries):
+        token = hveprime.gen_token(sk, I_star)
+        matches = [ci for ci, cipher in enumerate(C) if hveprime.match(token, cipher)]
+        assert set(matches) == set(results[qi]), 'Incorrect matched items'
+    assert hveprime.query(hveprime.gen_token(sk, indices[0]), cipher_message) == message, 'Incorrect decryption'
+
+
+def test_hve_query_reference():
+    """ Cross-check the multi-pairing query with the reference query
+    """
+    print("Start test_hve_query_reference()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = test_hve.create_hardcoded_test()
+    queries.append([WILDCARD] * len(indices[0]))
+    results.append(list(range(len(indices))))
+    (pk, sk) = hveprime.setup(width=len(indices[0]), group_param=group_param)
+    group = pk['group']
+
+    for qi, I_star in enumerate(queries):
+        token = hveprime.gen_token(sk, I_star)
+        prepared_token = hveprime.prepare_token(token)
+        for ci, x in enumerate(indices):
+            message = group.random(GT)
+            cipher = hveprime.encrypt(pk, x, message)
+
+            message_prime = hveprime.query(token, cipher)
+            assert message_prime == hveprime.query_reference(token, cipher), 'Queries do not agree'
+            assert (message_prime == message) == (ci in results[qi]), 'Incorrect decryption'
+            assert message_prime == hveprime.query(prepared_token, cipher), 'Prepared token does not agree'
+
+            cipher = hveprime.encrypt(pk, x)
+            matched = hveprime.match(prepared_token, cipher)
+            assert matched == (ci in results[qi]), 'Incorrect match'
+            assert matched == hveprime.query_reference(token, cipher, predicate_only=True, group=group), \
+                'Predicates do not agree'
+
+
+def test_hve_gen_tokens():
+    """ Generate tokens with a prepared secret key, with and without worker processes
+    """
+    print("Start test_hve_gen_tokens()")
+    group_param = parse_params_from_string(pairingcurves.PAIRING_CURVE_TYPE_A1_256_SAMPLE)
+
+    (indices, queries, results) = test_hve.create_hardcoded_test()
+    (pk, sk) = hveprime.setup(width=len(indices[0]), group_param=group_param)
+    C = hveprime.encrypt_many(pk, indices)
+
+    for max_workers in [0, 2]:
+        tokens = hveprime.gen_tokens(sk, queries, max_workers=max_workers)
+        for qi, token in enumerate(tokens):
+            matches = [ci for ci, cipher in enumerate(C) if hveprime.match(token, cipher)]
+            assert set(matches) == set(results[qi]), 'Incorrect matched items'
+
+
+def test_hve_asymmetric():
+    """ Run HVE over an asymmetric curve, with tokens in G2
+    """
+    print("Start test_hve_asymmetric()")
+    (indices, queries, results) = test_hve.create_hardcoded_test()
+    (pk, sk) = hveprime.setup(width=len(indices[0]), group_param='MNT224')
+    group = pk['group']
+    assert not group.is_symmetric(), 'Curve is not asymmetric'
+
+    C = hveprime.encrypt_many(pk, indices)
+    data = serialization.encode_ciphertexts(C, group, serialization.SCHEME_HVE_PRIME)
+    C = serialization.decode_ciphertexts(data, group)
+    for qi, I_star in enumerate(queries):
+        token = hveprime.gen_token(sk, I_star)
+        token = serialization.decode_token(serialization.encode_token(token, group, serialization.SCHEME_HVE_PRIME),
+                                           group)
+        matches = [ci for ci, cipher in enumerate(C) if hveprime.match(token, cipher)]
+        assert set(matches) == set(results[qi]), 'Incorrect matched items'
@@ -0,0 +1,27 @@
+""" Test the pairing group wrapper and its registry
+"""
+import pickle
+from .context import pairinggroup, pairingcurves, parse_params_from_string
+
+
+def test_group_negative_sign():
+    """ A group with negative signs is rebuilt on the same curve from its canonical parameters
+    """
+    print("Start test_group_negative_sign()")
+    param_str = pairingcurves.PAIRING_CURVE_TYPE_A_512_NEGATIVE_SIGN_SAMPLE
+    params = parse_params_from_string(param_str)
+    assert params['sign1'] == -1 and params['sign0'] == -1, 'Signs are lost'
+    assert parse_params_from_string(pairinggroup.canonical_params(param_str)) == params, \
+        'Canonical parameters differ'
+
+    group = pickle.loads(pickle.dumps(pairinggroup.get_group(params)))
+    assert group is pairinggroup.get_group(param_str), 'Group is not from the registry'
+
+    original = pairinggroup.PairingGroup()
+    original.init_from_str(param_str)
+    g = group.random(pairinggroup.G1)
+    h = group.random(pairinggroup.G2)
+    g_original = original.deserialize(group.serialize(g))
+    h_original = original.deserialize(group.serialize(h))
+    assert group.serialize(pairinggroup.pair(g, h)) == \
+        original.serialize(pairinggroup.pair(g_original, h_original)), 'Pairings differ'